@@ -27,6 +27,26 @@ target_metadata = Base.metadata
 def get_url():
     return str(settings.DATABASE_URL)
 
+def run_item_table_maintenance() -> None:
+    """Alter the per-product items_* tables after the migrations.
+
+    Enabled with `alembic -x item_tables=true upgrade head`; `-x item_workers=N`
+    sets how many tables are altered in parallel.
+    """
+    x_arguments = context.get_x_argument(as_dictionary=True)
+    if x_arguments.get("item_tables", "").lower() not in ("1", "true", "yes"):
+        return
+    from app.core import item_maintenance
+
+    workers = int(x_arguments["item_workers"]) if "item_workers" in x_arguments else None
+    counts = item_maintenance.run(workers=workers)
+    print(
+        f"Item tables: {counts['done']} checked, {counts['skipped']} already up to date, "
+        f"{counts['failed']} failed"
+    )
+    if counts["failed"]:
+        raise RuntimeError("Item table maintenance failed; rerun python -m app.maintenance to retry")
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -74,6 +94,10 @@ def run_migrations_online() -> None:
         with context.begin_transaction():
             context.run_migrations()
 
+    # Runs after the migration transaction has committed: it needs the
+    # item_table_schemas table and builds indexes outside a transaction
+    run_item_table_maintenance()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
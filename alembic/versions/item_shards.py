@@ -0,0 +1,36 @@
+"""item shard map
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'item_shards',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('shard', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('moving_to', sa.String(), nullable=True),
+        sa.Column('previous_shard', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index('ix_item_shards_shard', 'item_shards', ['shard'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_item_shards_shard', table_name='item_shards')
+    op.drop_table('item_shards')
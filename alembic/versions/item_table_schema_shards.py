@@ -0,0 +1,43 @@
+"""item table schema tracking per shard
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def _create(primary_key: tuple, with_shard: bool) -> None:
+    columns = [sa.Column('shard', sa.String(), nullable=False)] if with_shard else []
+    op.create_table(
+        'item_table_schemas',
+        *columns,
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint(*primary_key)
+    )
+
+
+def upgrade() -> None:
+    # Only progress records: item table maintenance rechecks every table on
+    # its next run, and tables already up to date need no DDL
+    op.drop_table('item_table_schemas')
+    _create(('shard', 'product_id'), with_shard=True)
+
+
+def downgrade() -> None:
+    op.drop_table('item_table_schemas')
+    _create(('product_id',), with_shard=False)
@@ -0,0 +1,36 @@
+"""codes unique among live products and companies
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+LIVE = sa.text('deleted_at IS NULL')
+
+
+def upgrade() -> None:
+    # Tombstoned rows keep their code until reclaim removes them; only live
+    # rows need to be unique
+    for table in ('companies', 'products'):
+        op.drop_index(f'ix_{table}_code', table_name=table)
+        op.create_index(
+            f'ix_{table}_code', table, ['code'], unique=True,
+            postgresql_where=LIVE, sqlite_where=LIVE,
+        )
+
+
+def downgrade() -> None:
+    # Fails if a live row and a tombstone share a code
+    for table in ('companies', 'products'):
+        op.drop_index(f'ix_{table}_code', table_name=table)
+        op.create_index(f'ix_{table}_code', table, ['code'], unique=True)
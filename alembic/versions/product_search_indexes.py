@@ -0,0 +1,68 @@
+"""product search indexes
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_products_company_id'), 'products', ['company_id'], unique=False)
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # Trigram indexes serve prefix ILIKE as well as fuzzy (%) matches
+        op.execute('CREATE INDEX ix_products_name_trgm ON products USING gin (name gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_products_code_trgm ON products USING gin (code gin_trgm_ops)')
+        op.execute(
+            "CREATE INDEX ix_products_description_fts ON products "
+            "USING gin (to_tsvector('simple', coalesce(description, '')))"
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE products_fts USING fts5("
+            "name, code, description, content='products', content_rowid='id')"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN "
+            "INSERT INTO products_fts(rowid, name, code, description) "
+            "VALUES (new.id, new.name, new.code, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN "
+            "INSERT INTO products_fts(products_fts, rowid, name, code, description) "
+            "VALUES ('delete', old.id, old.name, old.code, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER products_fts_au AFTER UPDATE ON products BEGIN "
+            "INSERT INTO products_fts(products_fts, rowid, name, code, description) "
+            "VALUES ('delete', old.id, old.name, old.code, old.description); "
+            "INSERT INTO products_fts(rowid, name, code, description) "
+            "VALUES (new.id, new.name, new.code, new.description); END"
+        )
+        op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_products_description_fts')
+        op.execute('DROP INDEX IF EXISTS ix_products_code_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_products_name_trgm')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS products_fts_au')
+        op.execute('DROP TRIGGER IF EXISTS products_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS products_fts_ai')
+        op.execute('DROP TABLE IF EXISTS products_fts')
+    op.drop_index(op.f('ix_products_company_id'), table_name='products')
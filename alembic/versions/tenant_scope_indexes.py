@@ -0,0 +1,31 @@
+"""tenant scope indexes
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_user_companies_user_id_company_id', 'user_companies', ['user_id', 'company_id'], unique=False
+    )
+    # (company_id, id) serves everything the single-column index did
+    op.create_index('ix_products_company_id_id', 'products', ['company_id', 'id'], unique=False)
+    op.drop_index(op.f('ix_products_company_id'), table_name='products')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_products_company_id'), 'products', ['company_id'], unique=False)
+    op.drop_index('ix_products_company_id_id', table_name='products')
+    op.drop_index('ix_user_companies_user_id_company_id', table_name='user_companies')
@@ -0,0 +1,44 @@
+"""tombstones and reclaim jobs
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('companies', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('products', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'reclaim_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('target_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('done', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_reclaim_jobs_id'), 'reclaim_jobs', ['id'], unique=False)
+    op.create_index('ix_reclaim_jobs_status_id', 'reclaim_jobs', ['status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reclaim_jobs_status_id', table_name='reclaim_jobs')
+    op.drop_index(op.f('ix_reclaim_jobs_id'), table_name='reclaim_jobs')
+    op.drop_table('reclaim_jobs')
+    op.drop_column('products', 'deleted_at')
+    op.drop_column('companies', 'deleted_at')
@@ -1,13 +1,13 @@
-from typing import Generator, Optional
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from app.core import security
+from app.core import security, tenancy
 from app.core.config import settings
-from app.core.database import SessionLocal
+from app.core.database import get_db
 from app.core.models import User
 from app.core.schemas import TokenPayload
 
@@ -15,13 +15,6 @@ reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
 )
 
-def get_db() -> Generator:
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
-
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(reusable_oauth2)
@@ -44,4 +37,11 @@ def get_current_user(
 def get_current_active_user(
     current_user: User = Depends(get_current_user),
 ) -> User:
-    return current_user 
\ No newline at end of file
+    return current_user 
+
+def get_company_scope(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Optional[frozenset]:
+    """Companies the caller may access, or None for unrestricted (admin) users."""
+    return tenancy.get_company_ids(db, current_user)
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import users, companies, products, items, auth
+from app.api.v1.endpoints import users, companies, products, items, images, auth, admin
 
 api_router = APIRouter()
 
@@ -7,4 +7,6 @@ api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(companies.router, prefix="/companies", tags=["companies"])
 api_router.include_router(products.router, prefix="/products", tags=["products"])
-api_router.include_router(items.router, prefix="/items", tags=["items"]) 
\ No newline at end of file
+api_router.include_router(items.router, prefix="/items", tags=["items"]) 
+api_router.include_router(images.router, prefix="/images", tags=["images"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
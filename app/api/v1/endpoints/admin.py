@@ -0,0 +1,210 @@
+import asyncio
+import os
+import time
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.core import admission, archive, metrics, pool_metrics, profiler, reclaim, shards, slow_query, startup
+from app.core.database import SessionReleaseRoute, get_db, get_engine
+from app.core.models import Product, ReclaimJob, User
+from app.core.schemas import ReclaimJob as ReclaimJobSchema
+from app.api.deps import get_current_user
+
+router = APIRouter(route_class=SessionReleaseRoute)
+
+def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
+@router.get("/slow-queries")
+def read_slow_queries(
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Recent slow queries with their route, redacted parameters and plan.
+    """
+    return slow_query.recent_slow_queries()
+
+
+@router.get("/metrics")
+def read_metrics(
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    In-process counters and latency/size summaries for this worker.
+    """
+    return metrics.snapshot()
+
+
+@router.get("/startup")
+def read_startup_profile(
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    How long each startup phase of this worker took.
+    """
+    return startup.report()
+
+
+@router.get("/pool")
+def read_pool_status(
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Connections of this worker's pools (main database and item shards) checked out and idle.
+    """
+    pool_status = pool_metrics.pool_status(get_engine())
+    shard_engines = shards.open_engines()
+    if shard_engines:
+        pool_status["shards"] = {
+            name: pool_metrics.pool_status(engine) for name, engine in shard_engines.items()
+        }
+    return pool_status
+
+
+@router.get("/admission")
+def read_admission(
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Active and queued requests per admission class in this worker.
+    """
+    return admission.snapshot()
+
+
+@router.get("/profile")
+async def read_profile(
+    seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    request_fraction: float = Query(1.0, gt=0, le=1),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    all_threads: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Sample this worker's requests for `seconds` and return the profile, as
+    collapsed stacks or speedscope JSON.  Each stack starts with the route
+    template; `request_fraction` profiles only that share of requests.
+    """
+    # The capture can run for minutes; don't hold a pooled connection for it
+    db.close()
+    try:
+        capture = profiler.start(interval_ms / 1000, request_fraction, all_threads)
+    except profiler.CaptureRunning:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already being captured in this worker"
+        )
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop(capture)
+    filename = f"profile-{os.getpid()}-{time.strftime('%Y%m%d%H%M%S', time.gmtime(capture.started_at))}"
+    headers = {
+        "X-Profile-Worker": str(os.getpid()),
+        "X-Profile-Samples": str(capture.samples),
+        "X-Profile-Requests": str(capture.requests),
+    }
+    if format == "speedscope":
+        headers["Content-Disposition"] = f'attachment; filename="{filename}.speedscope.json"'
+        return JSONResponse(await run_in_threadpool(capture.speedscope), headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}.folded"'
+    return PlainTextResponse(await run_in_threadpool(capture.collapsed), headers=headers)
+
+
+@router.post("/archive/{product_id}")
+def archive_items(
+    product_id: int,
+    db: Session = Depends(get_db),
+    older_than_days: Optional[int] = Query(None, ge=0),
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Move a product's old items into the cold archive now.
+    """
+    product = db.query(Product).filter(Product.id == product_id, Product.deleted_at.is_(None)).first()
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    db.close()
+    cutoff = archive.archive_cutoff(older_than_days)
+    archived = archive.archive_product(product_id, cutoff)
+    return {
+        "product_id": product_id,
+        "cutoff": cutoff,
+        "archived": archived,
+        "archived_total": archive.count_archived(product_id),
+    }
+
+
+@router.get("/reclaim-jobs", response_model=List[ReclaimJobSchema])
+def read_reclaim_jobs(
+    db: Session = Depends(get_db),
+    job_status: Optional[str] = Query(None, alias="status"),
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Background reclaim jobs for deleted products and companies, newest first.
+    """
+    query = db.query(ReclaimJob)
+    if job_status is not None:
+        query = query.filter(ReclaimJob.status == job_status)
+    return query.order_by(ReclaimJob.id.desc()).offset(skip).limit(limit).all()
+
+
+@router.get("/reclaim-jobs/{job_id}", response_model=ReclaimJobSchema)
+def read_reclaim_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Progress of one reclaim job.
+    """
+    job = db.get(ReclaimJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reclaim job not found"
+        )
+    return job
+
+
+@router.post("/reclaim-jobs/{job_id}/retry", response_model=ReclaimJobSchema)
+def retry_reclaim_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+) -> Any:
+    """
+    Requeue a failed reclaim job; it resumes from its recorded progress.
+    """
+    job = db.get(ReclaimJob, job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reclaim job not found"
+        )
+    if job.status != "failed":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only failed jobs can be retried"
+        )
+    job.status = "pending"
+    job.error = None
+    db.commit()
+    db.refresh(job)
+    reclaim.wake()
+    return job
@@ -1,20 +1,61 @@
-from datetime import timedelta
-from typing import Any
-from fastapi import APIRouter, Depends, HTTPException, status
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
 from app.core import security
 from app.core.config import settings
-from app.core.database import get_db, Base, engine
-from app.core.models import User
-from app.core.schemas import Token, UserCreate
+from app.core.database import SessionReleaseRoute, get_db, get_engine, Base
+from app.core.models import RefreshToken, User
+from app.core.schemas import RefreshTokenRequest, Token, UserCreate
 
-router = APIRouter()
+router = APIRouter(route_class=SessionReleaseRoute)
 
 def ensure_tables_exist():
     """Create all tables if they don't exist"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+
+def issue_tokens(db: Session, user_id: int, family_id: Optional[str] = None) -> dict:
+    """Create an access token and a refresh token; the caller commits."""
+    now = datetime.utcnow()
+    if family_id is None:
+        family_id = uuid.uuid4().hex
+        # A new login is a good moment to drop this user's dead tokens
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id, RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+    refresh_token, token_hash = security.create_refresh_token()
+    db.add(
+        RefreshToken(
+            token_hash=token_hash,
+            family_id=family_id,
+            user_id=user_id,
+            created_at=now,
+            expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return {
+        "access_token": security.create_access_token(
+            user_id, expires_delta=access_token_expires
+        ),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+    }
+
+def revoke_family(db: Session, family_id: str) -> None:
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+def invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 @router.post("/login", response_model=Token)
 def login(
@@ -26,6 +67,9 @@ def login(
     """
     ensure_tables_exist()  # Ensure tables exist before login
     user = db.query(User).filter(User.username == form_data.username).first()
+    # End the read transaction so the pooled connection is not held while
+    # bcrypt runs
+    db.commit()
     if not user or not security.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,13 +77,55 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return {
-        "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires
-        ),
-        "token_type": "bearer",
-    }
+    tokens = issue_tokens(db, user.id)
+    db.commit()
+    return tokens
+
+@router.post("/refresh", response_model=Token)
+def refresh(
+    *,
+    db: Session = Depends(get_db),
+    token_in: RefreshTokenRequest,
+) -> Any:
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    """
+    token = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == security.hash_refresh_token(token_in.refresh_token)
+    ).first()
+    if not token or token.expires_at < datetime.utcnow():
+        raise invalid_refresh_token()
+    # Revoke with a conditional update so two concurrent refreshes with the
+    # same token cannot both succeed
+    rotated = db.query(RefreshToken).filter(
+        RefreshToken.id == token.id, RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    if not rotated:
+        # A rotated-out token was presented again: assume it leaked and end
+        # the whole session
+        revoke_family(db, token.family_id)
+        db.commit()
+        raise invalid_refresh_token()
+    tokens = issue_tokens(db, token.user_id, family_id=token.family_id)
+    db.commit()
+    return tokens
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    *,
+    db: Session = Depends(get_db),
+    token_in: RefreshTokenRequest,
+) -> Response:
+    """
+    Revoke a refresh token and every token rotated from the same login.
+    """
+    token = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == security.hash_refresh_token(token_in.refresh_token)
+    ).first()
+    if token:
+        revoke_family(db, token.family_id)
+        db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.post("/register", response_model=Token)
 def register(
@@ -68,11 +154,16 @@ def register(
             detail="Email already registered"
         )
     
+    # Hashed only for registrations that can succeed.  End the read
+    # transaction first so the pooled connection is not held while bcrypt runs
+    db.commit()
+    hashed_password = security.get_password_hash(user_in.password)
+    
     # Create new user
     user = User(
         username=user_in.username,
         email=user_in.email,
-        hashed_password=security.get_password_hash(user_in.password),
+        hashed_password=hashed_password,
         role=user_in.role,
         permission=user_in.permission,
     )
@@ -80,11 +171,7 @@ def register(
     db.commit()
     db.refresh(user)
     
-    # Generate access token
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return {
-        "access_token": security.create_access_token(
-            user.id, expires_delta=access_token_expires
-        ),
-        "token_type": "bearer",
-    } 
\ No newline at end of file
+    # Generate access and refresh tokens
+    tokens = issue_tokens(db, user.id)
+    db.commit()
+    return tokens
@@ -1,14 +1,18 @@
-from typing import Any, List
+from datetime import datetime
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
-from app.core.models import Company, User
+from app.core import events, product_cache, reclaim, tenancy
+from app.core.database import SessionReleaseRoute, get_db
+from app.core.lookup import lookup_keys, resolve_in_order
+from app.core.models import Company, Product, User, UserCompany
 from app.core.schemas import Company as CompanySchema
-from app.core.schemas import CompanyCreate, CompanyUpdate
-from app.api.deps import get_current_user
+from app.core.schemas import CompanyCreate, CompanyUpdate, CompanyLookup, CompanyLookupResult
+from app.api.deps import get_current_user, get_company_scope
 
-router = APIRouter()
+router = APIRouter(route_class=SessionReleaseRoute)
 
 @router.get("/", response_model=List[CompanySchema])
 def read_companies(
@@ -16,13 +20,60 @@ def read_companies(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
-    Retrieve companies.
+    Retrieve the caller's companies.
     """
-    companies = db.query(Company).offset(skip).limit(limit).all()
+    query = db.query(Company).filter(Company.deleted_at.is_(None))
+    if scope is not None:
+        query = query.filter(Company.id.in_(scope))
+    companies = query.order_by(Company.id).offset(skip).limit(limit).all()
     return companies
 
+@router.get("/{company_id}/events")
+def company_events(
+    company_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> Any:
+    """
+    Server-sent events for item changes across all products of a company.
+    """
+    tenancy.check_company_access(scope, company_id)
+    company = db.query(Company).filter(Company.id == company_id, Company.deleted_at.is_(None)).first()
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Company not found"
+        )
+    # The stream can stay open for hours; don't hold a pooled connection for it
+    db.close()
+    return StreamingResponse(
+        events.event_stream((f"company:{company_id}",)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/lookup", response_model=CompanyLookupResult)
+def lookup_companies(
+    *,
+    db: Session = Depends(get_db),
+    lookup_in: CompanyLookup,
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> Any:
+    """
+    Fetch many companies by id (tax code) or code in one query, in request order.
+    """
+    field, keys = lookup_keys(ids=lookup_in.ids, codes=lookup_in.codes)
+    column = Company.id if field == "ids" else Company.code
+    query = db.query(Company).filter(column.in_(keys), Company.deleted_at.is_(None))
+    if scope is not None:
+        query = query.filter(Company.id.in_(scope))
+    return resolve_in_order(keys, query.all(), key=lambda company: getattr(company, column.key))
+
 @router.post("/", response_model=CompanySchema)
 def create_company(
     *,
@@ -46,8 +97,12 @@ def create_company(
         )
     company = Company(**company_in.dict())
     db.add(company)
+    if current_user.role != "admin":
+        # Managers are scoped to their companies, so they join the one they create
+        db.add(UserCompany(user_id=current_user.id, company_id=company.id))
     db.commit()
     db.refresh(company)
+    tenancy.invalidate(current_user.id)
     return company
 
 @router.put("/{company_id}", response_model=CompanySchema)
@@ -57,6 +112,7 @@ def update_company(
     company_id: str,
     company_in: CompanyUpdate,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
     Update a company.
@@ -66,7 +122,8 @@ def update_company(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    company = db.query(Company).filter(Company.id == company_id).first()
+    tenancy.check_company_access(scope, company_id)
+    company = db.query(Company).filter(Company.id == company_id, Company.deleted_at.is_(None)).first()
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -87,19 +144,88 @@ def delete_company(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Delete a company.
+    Delete a company. Its products and their items are reclaimed in the background.
+    Its code can be reused at once; its tax code only after reclaim has removed the row.
     """
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    company = db.query(Company).filter(Company.id == company_id).first()
+    company = db.query(Company).filter(Company.id == company_id, Company.deleted_at.is_(None)).first()
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Company not found"
         )
-    db.delete(company)
+    now = datetime.utcnow()
+    company.deleted_at = now
+    total = db.query(Product).filter(
+        Product.company_id == company_id, Product.deleted_at.is_(None)
+    ).update({Product.deleted_at: now}, synchronize_session=False)
+    reclaim.enqueue(db, "company", company_id, total=total)
+    db.commit()
+    db.refresh(company)
+    product_cache.invalidate()
+    reclaim.wake()
+    return company
+
+@router.post("/{company_id}/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+def add_company_user(
+    *,
+    db: Session = Depends(get_db),
+    company_id: str,
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> None:
+    """
+    Give a user access to a company.
+    """
+    if current_user.role not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    tenancy.check_company_access(scope, company_id)
+    if not db.query(Company).filter(Company.id == company_id, Company.deleted_at.is_(None)).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Company not found"
+        )
+    if not db.query(User).filter(User.id == user_id).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    membership = db.query(UserCompany).filter(
+        UserCompany.user_id == user_id, UserCompany.company_id == company_id
+    ).first()
+    if not membership:
+        db.add(UserCompany(user_id=user_id, company_id=company_id))
+        db.commit()
+    tenancy.invalidate(user_id)
+
+@router.delete("/{company_id}/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
+def remove_company_user(
+    *,
+    db: Session = Depends(get_db),
+    company_id: str,
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> None:
+    """
+    Revoke a user's access to a company.
+    """
+    if current_user.role not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    tenancy.check_company_access(scope, company_id)
+    db.query(UserCompany).filter(
+        UserCompany.user_id == user_id, UserCompany.company_id == company_id
+    ).delete(synchronize_session=False)
     db.commit()
-    return company 
\ No newline at end of file
+    tenancy.invalidate(user_id)
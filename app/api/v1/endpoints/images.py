@@ -0,0 +1,117 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
+from fastapi.responses import FileResponse, RedirectResponse, Response
+
+from app.core import images
+from app.core.config import settings
+from app.core.database import SessionReleaseRoute
+from app.core.models import User
+from app.core.schemas import ImageUpload
+from app.core.static_files import IMMUTABLE_CACHE_CONTROL, etag_matches
+from app.api.deps import get_current_user
+
+router = APIRouter(route_class=SessionReleaseRoute)
+
+@router.post("/", response_model=ImageUpload, status_code=status.HTTP_201_CREATED)
+def upload_image(
+    *,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Upload an image for a company logo or product thumbnail; returns its URLs.
+    """
+    if current_user.role not in ["admin", "manager"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    try:
+        image_id, content_type, size = images.save_original(file.file)
+    except images.InvalidImage as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(exc)
+        )
+    # Rendered in the background; a request that arrives first renders on demand
+    images.render_thumbnails(image_id)
+    return {
+        "id": image_id,
+        "url": images.image_url(image_id),
+        "thumbnail_url": images.variant_url(image_id, settings.IMAGE_THUMBNAIL_WIDTHS[0]),
+        "content_type": content_type,
+        "size": size,
+    }
+
+def _not_modified(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag},
+        )
+    return None
+
+def _image_response(path: str, media_type: str, etag: str) -> Response:
+    # The URL names the content, so any cached copy is still current
+    return FileResponse(
+        path, media_type=media_type, headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+    )
+
+def _not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Image not found"
+    )
+
+@router.get("/{image_id}")
+async def read_image(image_id: str, request: Request) -> Response:
+    """
+    The original image.  Image URLs are unguessable and need no token, so they
+    work in <img> tags.
+    """
+    if not images.IMAGE_ID.match(image_id):
+        raise _not_found()
+    etag = f'"{image_id[:32]}"'
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    content_type = images.original_content_type(image_id)
+    if content_type is None:
+        raise _not_found()
+    return _image_response(images.original_path(image_id), content_type, etag)
+
+@router.get("/{image_id}/{width}.{fmt}")
+async def read_image_variant(image_id: str, width: int, fmt: str, request: Request) -> Response:
+    """
+    The image resized to one of the allowed widths, in webp, jpeg or png.
+    """
+    if (
+        not images.IMAGE_ID.match(image_id)
+        or width not in settings.IMAGE_VARIANT_WIDTHS
+        or fmt not in images.VARIANT_FORMATS
+    ):
+        raise _not_found()
+    if not images.resizing_available():
+        # Not cached, so the variant is served once resizing is installed
+        return RedirectResponse(
+            images.image_url(image_id),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": "no-cache"},
+        )
+    etag = f'"{image_id[:32]}.{width}.{fmt}"'
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    try:
+        variant = await images.get_variant(image_id, width, fmt)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Image cannot be resized"
+        )
+    if variant is None:
+        raise _not_found()
+    path, _ = variant
+    return _image_response(path, images.VARIANT_FORMATS[fmt], etag)
@@ -1,36 +1,22 @@
-from typing import Any, List
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import Table, Column, String, DateTime, MetaData, create_engine
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 from datetime import datetime
 import uuid
 
-from app.core.database import get_db, engine
-from app.core.models import Product, User
+from app.core import archive, events, product_cache, shards
+from app.core.database import SessionReleaseRoute, get_db
+from app.core.item_tables import bind_items_table
+from app.core.models import User
 from app.core.schemas import Item as ItemSchema
-from app.core.schemas import ItemCreate, BatchItemCreate
-from app.api.deps import get_current_user
+from app.core.schemas import ItemCreate, BatchItemCreate, ItemLookup, ItemLookupResult
+from app.core.lookup import lookup_keys, resolve_in_order
+from app.core.tenancy import check_company_access
+from app.api.deps import get_current_user, get_company_scope
 
-router = APIRouter()
-
-def get_items_table(product_id: int) -> Table:
-    """Get or create items table for a specific product."""
-    table_name = f"items_{product_id}"
-    metadata = MetaData()
-    
-    # Define the table structure
-    items_table = Table(
-        table_name,
-        metadata,
-        Column("id", String, primary_key=True),
-        Column("key", String, nullable=False),
-        Column("box_key", String, nullable=False),
-        Column("created_at", DateTime, default=datetime.utcnow, nullable=False)
-    )
-    
-    # Create the table if it doesn't exist
-    metadata.create_all(engine)
-    return items_table
+router = APIRouter(route_class=SessionReleaseRoute)
 
 @router.get("/{product_id}", response_model=List[ItemSchema])
 def read_items(
@@ -39,20 +25,86 @@ def read_items(
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
-    Retrieve items for a specific product.
+    Retrieve items for a specific product, continuing into archived items.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = product_cache.get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    check_company_access(scope, product.company_id, detail="Product not found")
     
-    items_table = get_items_table(product_id)
+    items_table = bind_items_table(db, product)
     items = db.execute(items_table.select().offset(skip).limit(limit)).fetchall()
-    return [dict(item) for item in items]
+    items = [dict(item._mapping) for item in items]
+    if len(items) < limit:
+        # Archived items follow the live ones
+        if items or not skip:
+            live_count = skip + len(items)
+        else:
+            live_count = db.execute(select(func.count()).select_from(items_table)).scalar()
+        items.extend(archive.read_archived(product_id, max(skip - live_count, 0), limit - len(items)))
+    return items
+
+@router.get("/{product_id}/events")
+def item_events(
+    product_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> Any:
+    """
+    Server-sent events for items created or deleted under a product.
+    """
+    product = product_cache.get_product(db, product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    check_company_access(scope, product.company_id, detail="Product not found")
+    # The stream can stay open for hours; don't hold a pooled connection for it
+    db.close()
+    return StreamingResponse(
+        events.event_stream((f"product:{product_id}",)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/{product_id}/lookup", response_model=ItemLookupResult)
+def lookup_items(
+    *,
+    product_id: int,
+    db: Session = Depends(get_db),
+    lookup_in: ItemLookup,
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> Any:
+    """
+    Fetch many items of a product by id or key in one query, in request order.
+    """
+    field, keys = lookup_keys(ids=lookup_in.ids, keys=lookup_in.keys)
+    product = product_cache.get_product(db, product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    check_company_access(scope, product.company_id, detail="Product not found")
+
+    items_table = bind_items_table(db, product)
+    column = items_table.c.id if field == "ids" else items_table.c.key
+    rows = db.execute(items_table.select().where(column.in_(keys))).fetchall()
+    items = [dict(row._mapping) for row in rows]
+    if len(items) < len(keys):
+        found = {item[column.key] for item in items}
+        missing = [key for key in keys if key not in found]
+        items.extend(archive.lookup_archived(product_id, column.key, missing))
+    return resolve_in_order(keys, items, key=lambda item: item[column.key])
 
 @router.post("/{product_id}", response_model=ItemSchema)
 def create_item(
@@ -61,18 +113,21 @@ def create_item(
     db: Session = Depends(get_db),
     item_in: ItemCreate,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
     Create new item for a specific product.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = product_cache.get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    check_company_access(scope, product.company_id, detail="Product not found")
+    shards.check_writable(product)
     
-    items_table = get_items_table(product_id)
+    items_table = bind_items_table(db, product)
     item_id = str(uuid.uuid4())
     
     item = {
@@ -84,6 +139,7 @@ def create_item(
     
     db.execute(items_table.insert().values(**item))
     db.commit()
+    events.publish_item_event(db, "item.created", product_id, product.company_id, item)
     return item
 
 @router.post("/{product_id}/batch", response_model=List[ItemSchema])
@@ -93,18 +149,21 @@ def create_batch_items(
     db: Session = Depends(get_db),
     batch_in: BatchItemCreate,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
     Create multiple items for a specific product.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = product_cache.get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    check_company_access(scope, product.company_id, detail="Product not found")
+    shards.check_writable(product)
     
-    items_table = get_items_table(product_id)
+    items_table = bind_items_table(db, product)
     items = []
     
     for _ in range(batch_in.quantity):
@@ -119,6 +178,10 @@ def create_batch_items(
     
     db.execute(items_table.insert(), items)
     db.commit()
+    events.publish_item_event(
+        db, "items.batch_created", product_id, product.company_id,
+        events.batch_event_data(items, batch_in.box_key),
+    )
     return items
 
 @router.delete("/{product_id}/{item_id}", response_model=ItemSchema)
@@ -128,28 +191,36 @@ def delete_item(
     item_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
     Delete an item.
     """
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = product_cache.get_product(db, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    check_company_access(scope, product.company_id, detail="Product not found")
+    shards.check_writable(product)
     
-    items_table = get_items_table(product_id)
+    items_table = bind_items_table(db, product)
     item = db.execute(
         items_table.select().where(items_table.c.id == item_id)
     ).first()
     
+    if item:
+        db.execute(items_table.delete().where(items_table.c.id == item_id))
+        db.commit()
+        item = dict(item._mapping)
+    else:
+        item = archive.delete_archived(product_id, item_id)
     if not item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found"
         )
-    
-    db.execute(items_table.delete().where(items_table.c.id == item_id))
-    db.commit()
-    return dict(item) 
\ No newline at end of file
+
+    events.publish_item_event(db, "item.deleted", product_id, product.company_id, item)
+    return item 
\ No newline at end of file
@@ -1,34 +1,81 @@
-from typing import Any, List
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Any, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core import product_cache, reclaim, shards
+from app.core.database import SessionReleaseRoute, get_db
+from app.core.lookup import lookup_keys, resolve_in_order
+from app.core.search import search_products
+from app.core.tenancy import check_company_access
 from app.core.models import Product, User, Company
 from app.core.schemas import Product as ProductSchema
-from app.core.schemas import ProductCreate, ProductUpdate
-from app.api.deps import get_current_user
+from app.core.schemas import ProductCreate, ProductUpdate, ProductLookup, ProductLookupResult
+from app.api.deps import get_current_user, get_company_scope
 
-router = APIRouter()
+router = APIRouter(route_class=SessionReleaseRoute)
 
 @router.get("/", response_model=List[ProductSchema])
 def read_products(
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
+    company_id: Optional[str] = None,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
-    Retrieve products.
+    Retrieve products of the caller's companies, optionally only one company.
     """
-    products = db.query(Product).offset(skip).limit(limit).all()
+    query = db.query(Product).filter(Product.deleted_at.is_(None))
+    if company_id is not None:
+        query = query.filter(Product.company_id == company_id)
+    if scope is not None:
+        query = query.filter(Product.company_id.in_(scope))
+    products = query.order_by(Product.id).offset(skip).limit(limit).all()
     return products
 
+@router.get("/search", response_model=List[ProductSchema])
+def search(
+    db: Session = Depends(get_db),
+    q: Optional[str] = Query(None, max_length=200),
+    company_id: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> Any:
+    """
+    Search products by name or code prefix, fuzzy name match and description words.
+    """
+    query = search_products(db, q=q, company_id=company_id, company_ids=scope)
+    return query.offset(skip).limit(limit).all()
+
+@router.post("/lookup", response_model=ProductLookupResult)
+def lookup_products(
+    *,
+    db: Session = Depends(get_db),
+    lookup_in: ProductLookup,
+    current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
+) -> Any:
+    """
+    Fetch many products by id or code in one query, in request order.
+    """
+    field, keys = lookup_keys(ids=lookup_in.ids, codes=lookup_in.codes)
+    column = Product.id if field == "ids" else Product.code
+    query = db.query(Product).filter(column.in_(keys), Product.deleted_at.is_(None))
+    if scope is not None:
+        query = query.filter(Product.company_id.in_(scope))
+    return resolve_in_order(keys, query.all(), key=lambda product: getattr(product, column.key))
+
 @router.post("/", response_model=ProductSchema)
 def create_product(
     *,
     db: Session = Depends(get_db),
     product_in: ProductCreate,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
     Create new product.
@@ -38,13 +85,16 @@ def create_product(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    company = db.query(Company).filter(Company.id == product_in.company_id).first()
+    check_company_access(scope, product_in.company_id)
+    company = db.query(Company).filter(
+        Company.id == product_in.company_id, Company.deleted_at.is_(None)
+    ).first()
     if not company:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Company not found"
         )
-    product = db.query(Product).filter(Product.code == product_in.code).first()
+    product = db.query(Product).filter(Product.code == product_in.code, Product.deleted_at.is_(None)).first()
     if product:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -52,6 +102,8 @@ def create_product(
         )
     product = Product(**product_in.dict())
     db.add(product)
+    db.flush()
+    shards.assign(db, product.id)
     db.commit()
     db.refresh(product)
     return product
@@ -63,6 +115,7 @@ def update_product(
     product_id: int,
     product_in: ProductUpdate,
     current_user: User = Depends(get_current_user),
+    scope: Optional[frozenset] = Depends(get_company_scope),
 ) -> Any:
     """
     Update a product.
@@ -72,17 +125,19 @@ def update_product(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.query(Product).filter(Product.id == product_id, Product.deleted_at.is_(None)).first()
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    check_company_access(scope, product.company_id, detail="Product not found")
     for field, value in product_in.dict(exclude_unset=True).items():
         setattr(product, field, value)
     db.add(product)
     db.commit()
     db.refresh(product)
+    product_cache.invalidate(product.id)
     return product
 
 @router.delete("/{product_id}", response_model=ProductSchema)
@@ -93,19 +148,23 @@ def delete_product(
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
-    Delete a product.
+    Delete a product. Its items are reclaimed in the background.
     """
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.query(Product).filter(Product.id == product_id, Product.deleted_at.is_(None)).first()
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    db.delete(product)
+    product.deleted_at = datetime.utcnow()
+    reclaim.enqueue(db, "product", product.id, total=1)
     db.commit()
-    return product 
\ No newline at end of file
+    db.refresh(product)
+    product_cache.invalidate(product.id)
+    reclaim.wake()
+    return product
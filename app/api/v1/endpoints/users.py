@@ -1,15 +1,16 @@
+from datetime import datetime
 from typing import Any, List
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
-from app.core import security
-from app.core.database import get_db
-from app.core.models import User
+from app.core import security, tenancy
+from app.core.database import SessionReleaseRoute, get_db
+from app.core.models import RefreshToken, User, UserCompany
 from app.core.schemas import User as UserSchema
 from app.core.schemas import UserCreate, UserUpdate
 from app.api.deps import get_current_user
 
-router = APIRouter()
+router = APIRouter(route_class=SessionReleaseRoute)
 
 @router.get("/", response_model=List[UserSchema])
 def read_users(
@@ -85,6 +86,10 @@ def update_user(
         )
     if user_in.password:
         user.hashed_password = security.get_password_hash(user_in.password)
+        # A password change ends existing sessions
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user.id, RefreshToken.revoked_at.is_(None)
+        ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
     user.username = user_in.username
     user.role = user_in.role
     user.permission = user_in.permission
@@ -114,6 +119,9 @@ def delete_user(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
+    db.query(UserCompany).filter(UserCompany.user_id == user.id).delete(synchronize_session=False)
+    db.query(RefreshToken).filter(RefreshToken.user_id == user.id).delete(synchronize_session=False)
     db.delete(user)
     db.commit()
+    tenancy.invalidate(user.id)
     return user 
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""Move old items into the cold archive.
+
+    python -m app.archive [--older-than-days N] [--product-id ID ...]
+
+Archives items older than ITEM_ARCHIVE_AFTER_DAYS (or --older-than-days) for
+every live product, or only the given ones.  Safe to run while the API is
+serving and to run again; each product is locked while it is archived.
+"""
+import argparse
+
+from app.core import archive
+from app.core.database import SessionLocal
+from app.core.models import Product
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive old items to compressed segment files.")
+    parser.add_argument("--older-than-days", type=int, default=None)
+    parser.add_argument("--product-id", type=int, action="append", dest="product_ids")
+    options = parser.parse_args()
+
+    product_ids = options.product_ids
+    if not product_ids:
+        db = SessionLocal()
+        try:
+            product_ids = [
+                product_id
+                for (product_id,) in db.query(Product.id).filter(Product.deleted_at.is_(None)).order_by(Product.id)
+            ]
+        finally:
+            db.close()
+
+    cutoff = archive.archive_cutoff(options.older_than_days)
+    total = 0
+    for product_id in product_ids:
+        archived = archive.archive_product(product_id, cutoff)
+        if archived:
+            print(f"items_{product_id}: archived {archived} items")
+        total += archived
+    print(f"Archived {total} items created before {cutoff:%Y-%m-%d %H:%M:%S} from {len(product_ids)} products")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+import anyio
+from starlette.responses import JSONResponse
+
+from app.core import metrics
+from app.core.config import settings
+
+# Share of the worker's database connections (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# each class may run requests against at once, so no class can drain the pool
+# and starve the others.  ADMISSION_CONCURRENCY and ADMISSION_QUEUE override
+# the resulting limits.
+CONNECTION_SHARE = {"auth": 0.2, "reads": 0.4, "item_writes": 0.2, "batch": 0.1, "other": 0.1}
+MIN_CONCURRENCY = 2
+DEFAULT_QUEUE = {"auth": 64, "reads": 256, "item_writes": 128, "batch": 64, "other": 64}
+
+# The app's middleware instance, for the admin endpoint
+_middleware = None
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Admission class of a request, or None for requests that are never limited."""
+    prefix = settings.API_V1_STR + "/"
+    if method == "OPTIONS" or not path.startswith(prefix):
+        return None
+    path = path[len(prefix) - 1:]
+    if path.endswith("/events"):
+        # Change feed streams stay open for hours and would pin a slot
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/admin/archive/"):
+        return "batch"
+    if path.startswith("/admin/"):
+        # Diagnostics must stay reachable while the API is overloaded
+        return None
+    if method in ("GET", "HEAD") or path.endswith("/lookup"):
+        return "reads"
+    if path.startswith("/items/"):
+        return "batch" if path.endswith("/batch") else "item_writes"
+    return "other"
+
+
+def default_concurrency() -> dict:
+    """Per-class limits sized against this worker's connection pool.
+
+    The limits add up to at most the pool size: classes raised to the
+    minimum are paid for by the classes furthest above their share.
+    """
+    connections = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    minimum = max(1, min(MIN_CONCURRENCY, connections // len(CONNECTION_SHARE)))
+    limits = {
+        name: max(minimum, int(share * connections)) for name, share in CONNECTION_SHARE.items()
+    }
+    while sum(limits.values()) > connections:
+        over = [name for name in limits if limits[name] > minimum]
+        if not over:
+            break
+        name = max(over, key=lambda name: (limits[name] - CONNECTION_SHARE[name] * connections, limits[name]))
+        limits[name] -= 1
+    return limits
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        self.reason = reason
+
+
+class Limiter:
+    """Concurrency limit with a bounded FIFO queue.
+
+    Runs on the worker's event loop only, so no locking is needed.  A
+    released slot is handed straight to the oldest waiter.
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self, timeout: float) -> None:
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.queue_size:
+            raise Rejected("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise Rejected("timeout") from None
+            raise
+
+    def release(self) -> None:
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter; active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionMiddleware:
+    """Per-route-class concurrency limits with bounded queues.
+
+    Each class (auth, reads, item writes, batch, everything else) gets its own
+    slots, so a login storm or a large batch import queues behind its own
+    limit instead of taking the threadpool and connection pool from scanner
+    reads.  A request that finds its queue full, or waits longer than
+    ADMISSION_QUEUE_TIMEOUT_SECONDS, gets 503 with Retry-After.  Limits are
+    per worker process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        concurrency = {**default_concurrency(), **settings.ADMISSION_CONCURRENCY}
+        queue = {**DEFAULT_QUEUE, **settings.ADMISSION_QUEUE}
+        self.limiters = {
+            name: Limiter(name, concurrency[name], queue[name]) for name in CONNECTION_SHARE
+        }
+        self.threadpool_sized = False
+        global _middleware
+        _middleware = self
+
+    def _size_threadpool(self) -> None:
+        # Sync endpoints share anyio's threadpool; make it large enough that the
+        # class limits, not the pool, decide who runs
+        threads = anyio.to_thread.current_default_thread_limiter()
+        total = sum(limiter.concurrency for limiter in self.limiters.values())
+        if threads.total_tokens < total:
+            threads.total_tokens = total
+        self.threadpool_sized = True
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        name = route_class(scope["method"], scope["path"])
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        if not self.threadpool_sized:
+            self._size_threadpool()
+
+        limiter = self.limiters[name]
+        started = time.perf_counter()
+        try:
+            await limiter.acquire(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except Rejected as exc:
+            metrics.increment("admission.rejected", route_class=name, reason=exc.reason)
+            response = JSONResponse(
+                {"detail": "Server is busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        metrics.observe("admission.queue_wait_ms", (time.perf_counter() - started) * 1000, route_class=name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+def snapshot() -> dict:
+    """Current slot and queue usage per route class in this worker."""
+    if _middleware is None:
+        return {}
+    return {
+        name: {
+            "concurrency": limiter.concurrency,
+            "active": limiter.active,
+            "queued": len(limiter.waiters),
+            "queue_size": limiter.queue_size,
+        }
+        for name, limiter in _middleware.limiters.items()
+    }
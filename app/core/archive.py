@@ -0,0 +1,346 @@
+"""Cold storage for old items.
+
+Items older than ITEM_ARCHIVE_AFTER_DAYS are moved out of their items_{id}
+table into append-only segment files under ITEM_ARCHIVE_DIR/{product_id}/.
+A segment holds up to ITEM_ARCHIVE_SEGMENT_ROWS rows sorted by id, stored
+column by column so a lookup decompresses only the column it searches.
+Each product directory has an index.json listing its segments with their row
+counts and per-column min/max, which lets reads skip segments that cannot
+contain a requested id, key or offset.  Items deleted after archival are
+recorded in the index rather than rewriting the segment.
+"""
+import fcntl
+import json
+import os
+import shutil
+import struct
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional
+
+from sqlalchemy import select
+
+from app.core import item_tables, metrics, shards
+from app.core.config import settings
+
+MAGIC = b"ITEMSEG1"
+COLUMNS = ("id", "key", "box_key", "created_at")
+# Columns with a min/max range in the index
+INDEXED_COLUMNS = ("id", "key", "created_at")
+# Fixed width so timestamps compare correctly as strings
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# product_id -> ((mtime_ns, size), index)
+_indexes = {}
+
+
+def product_dir(product_id: int) -> str:
+    return os.path.join(settings.ITEM_ARCHIVE_DIR, str(product_id))
+
+
+def _index_path(product_id: int) -> str:
+    return os.path.join(product_dir(product_id), "index.json")
+
+
+def _empty_index() -> dict:
+    return {"segments": []}
+
+
+def load_index(product_id: int) -> dict:
+    """The product's segment index, re-read only when the file changes."""
+    path = _index_path(product_id)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        _indexes.pop(product_id, None)
+        return _empty_index()
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _indexes.get(product_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    index = _read_index(product_id)
+    _indexes[product_id] = (version, index)
+    return index
+
+
+def _read_index(product_id: int) -> dict:
+    """Uncached read for writers, which modify the result."""
+    try:
+        with open(_index_path(product_id)) as index_file:
+            return json.load(index_file)
+    except FileNotFoundError:
+        return _empty_index()
+
+
+def _write_index(product_id: int, index: dict) -> None:
+    path = _index_path(product_id)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as index_file:
+        json.dump(index, index_file, separators=(",", ":"))
+        index_file.flush()
+        os.fsync(index_file.fileno())
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def product_lock(product_id: int):
+    """Serialize archive writers and shard moves of one product across processes."""
+    directory = product_dir(product_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+def write_segment(path: str, rows: List[dict]) -> dict:
+    """Write rows (sorted by id) as a columnar segment; return its index entry."""
+    blocks = []
+    header = {"rows": len(rows), "columns": {}}
+    offset = 0
+    columns = {}
+    for name in COLUMNS:
+        values = [_encode(row[name]) for row in rows]
+        columns[name] = values
+        block = zlib.compress(json.dumps(values, separators=(",", ":")).encode())
+        header["columns"][name] = [offset, len(block)]
+        offset += len(block)
+        blocks.append(block)
+    header_bytes = json.dumps(header).encode()
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as segment_file:
+        segment_file.write(MAGIC)
+        segment_file.write(struct.pack(">I", len(header_bytes)))
+        segment_file.write(header_bytes)
+        for block in blocks:
+            segment_file.write(block)
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+    os.replace(tmp_path, path)
+    return {
+        "file": os.path.basename(path),
+        "rows": len(rows),
+        "min": {name: min(columns[name]) for name in INDEXED_COLUMNS},
+        "max": {name: max(columns[name]) for name in INDEXED_COLUMNS},
+        "deleted": [],
+    }
+
+
+@lru_cache(maxsize=settings.ITEM_ARCHIVE_CACHE_COLUMNS)
+def read_column(path: str, name: str) -> list:
+    """Decompress one column of a segment.  Segments never change once written."""
+    with open(path, "rb") as segment_file:
+        if segment_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an item archive segment")
+        (header_length,) = struct.unpack(">I", segment_file.read(4))
+        header = json.loads(segment_file.read(header_length))
+        offset, length = header["columns"][name]
+        segment_file.seek(len(MAGIC) + 4 + header_length + offset)
+        block = segment_file.read(length)
+    metrics.increment("archive.column_reads")
+    return json.loads(zlib.decompress(block))
+
+
+def _segment_rows(product_id: int, segment: dict, positions: List[int]) -> List[dict]:
+    path = os.path.join(product_dir(product_id), segment["file"])
+    columns = {name: read_column(path, name) for name in COLUMNS}
+    rows = []
+    for position in positions:
+        row = {name: columns[name][position] for name in COLUMNS}
+        row["created_at"] = datetime.strptime(row["created_at"], TIMESTAMP_FORMAT)
+        rows.append(row)
+    return rows
+
+
+def _live_positions(product_id: int, segment: dict) -> List[int]:
+    if not segment["deleted"]:
+        return list(range(segment["rows"]))
+    path = os.path.join(product_dir(product_id), segment["file"])
+    deleted = set(segment["deleted"])
+    return [position for position, item_id in enumerate(read_column(path, "id")) if item_id not in deleted]
+
+
+def count_archived(product_id: int) -> int:
+    return sum(segment["rows"] - len(segment["deleted"]) for segment in load_index(product_id)["segments"])
+
+
+def read_archived(product_id: int, skip: int, limit: int) -> List[dict]:
+    """Archived items in archive order, paged like the live table."""
+    items = []
+    for segment in load_index(product_id)["segments"]:
+        if len(items) >= limit:
+            break
+        live_rows = segment["rows"] - len(segment["deleted"])
+        if skip >= live_rows:
+            # Skipped without opening the file
+            skip -= live_rows
+            continue
+        positions = _live_positions(product_id, segment)[skip:skip + limit - len(items)]
+        skip = 0
+        items.extend(_segment_rows(product_id, segment, positions))
+    return items
+
+
+def lookup_archived(product_id: int, field: str, keys: List[str]) -> List[dict]:
+    """Archived items whose id or key is in keys."""
+    wanted = set(keys)
+    items = []
+    for segment in load_index(product_id)["segments"]:
+        low, high = segment["min"][field], segment["max"][field]
+        candidates = {key for key in wanted if low <= key <= high}
+        if not candidates:
+            continue
+        path = os.path.join(product_dir(product_id), segment["file"])
+        deleted = set(segment["deleted"])
+        ids = read_column(path, "id")
+        values = ids if field == "id" else read_column(path, field)
+        positions = [
+            position for position, value in enumerate(values)
+            if value in candidates and ids[position] not in deleted
+        ]
+        if positions:
+            items.extend(_segment_rows(product_id, segment, positions))
+            if field == "id":
+                wanted -= {ids[position] for position in positions}
+                if not wanted:
+                    break
+    return items
+
+
+def delete_archived(product_id: int, item_id: str) -> Optional[dict]:
+    """Mark an archived item deleted; return it, or None if it is not archived."""
+    if not load_index(product_id)["segments"]:
+        return None
+    with product_lock(product_id):
+        index = _read_index(product_id)
+        for segment in index["segments"]:
+            if not segment["min"]["id"] <= item_id <= segment["max"]["id"] or item_id in segment["deleted"]:
+                continue
+            path = os.path.join(product_dir(product_id), segment["file"])
+            ids = read_column(path, "id")
+            if item_id not in ids:
+                continue
+            item = _segment_rows(product_id, segment, [ids.index(item_id)])[0]
+            segment["deleted"].append(item_id)
+            _write_index(product_id, index)
+            return item
+    return None
+
+
+def _discard_pending(product_id: int, segment: dict) -> None:
+    index = _read_index(product_id)
+    index["pending"] = [entry for entry in index.get("pending", []) if entry["file"] != segment["file"]]
+    _write_index(product_id, index)
+    try:
+        os.remove(os.path.join(product_dir(product_id), segment["file"]))
+    except FileNotFoundError:
+        pass
+
+
+def _publish_pending(product_id: int, segment: dict) -> None:
+    index = _read_index(product_id)
+    index["pending"] = [entry for entry in index.get("pending", []) if entry["file"] != segment["file"]]
+    index["segments"].append(segment)
+    _write_index(product_id, index)
+
+
+def _settle_pending(product_id: int, shard: str, items_table) -> None:
+    """Finish segments whose archive run stopped between writing and publishing them."""
+    for segment in _read_index(product_id).get("pending", []):
+        with shards.get_shard_engine(shard).connect() as connection:
+            live = connection.execute(
+                select(items_table.c.id)
+                .where(
+                    items_table.c.id >= segment["min"]["id"],
+                    items_table.c.id <= segment["max"]["id"],
+                    items_table.c.created_at <= datetime.strptime(segment["max"]["created_at"], TIMESTAMP_FORMAT),
+                )
+                .limit(1)
+            ).first()
+        # The delete is one transaction: either all of the segment's rows are
+        # still live or none are
+        if live is None:
+            _publish_pending(product_id, segment)
+        else:
+            _discard_pending(product_id, segment)
+
+
+def archive_product(product_id: int, cutoff: datetime) -> int:
+    """Move a product's items created before cutoff into the archive.
+
+    Each segment is written and listed as pending in the index before its
+    rows are deleted, and becomes readable only after the delete commits.  A
+    pending segment left by a crash is settled by the next run: published if
+    its rows are gone from the live table, dropped otherwise.
+    """
+    archived = 0
+    with product_lock(product_id):
+        # Read under the lock, which shard moves also hold
+        shard = shards.product_shard(product_id)
+        engine = shards.get_shard_engine(shard)
+        items_table = item_tables.get_items_table(product_id, shard)
+        _settle_pending(product_id, shard, items_table)
+        while True:
+            with engine.connect() as connection:
+                rows = [
+                    dict(row._mapping)
+                    for row in connection.execute(
+                        select(items_table)
+                        .where(items_table.c.created_at < cutoff)
+                        .order_by(items_table.c.id)
+                        .limit(settings.ITEM_ARCHIVE_SEGMENT_ROWS)
+                    )
+                ]
+            if not rows:
+                break
+            name = f"seg-{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.col"
+            path = os.path.join(product_dir(product_id), name)
+            segment = write_segment(path, rows)
+            index = _read_index(product_id)
+            index.setdefault("pending", []).append(segment)
+            _write_index(product_id, index)
+            try:
+                with engine.begin() as connection:
+                    # Rows are created with the current time, so nothing older
+                    # than cutoff can appear inside this id range meanwhile
+                    deleted = connection.execute(
+                        items_table.delete().where(
+                            items_table.c.created_at < cutoff,
+                            items_table.c.id >= rows[0]["id"],
+                            items_table.c.id <= rows[-1]["id"],
+                        )
+                    ).rowcount
+                    if deleted != len(rows):
+                        raise RuntimeError(
+                            f"Archiving items_{product_id} deleted {deleted} rows, expected {len(rows)}"
+                        )
+            except Exception:
+                _discard_pending(product_id, segment)
+                raise
+            _publish_pending(product_id, segment)
+            archived += len(rows)
+            metrics.increment("archive.rows_archived", len(rows))
+    return archived
+
+
+def drop_archive(product_id: int) -> None:
+    """Delete a product's archive; used when the product is reclaimed."""
+    _indexes.pop(product_id, None)
+    shutil.rmtree(product_dir(product_id), ignore_errors=True)
+
+
+def archive_cutoff(older_than_days: Optional[int] = None) -> datetime:
+    days = settings.ITEM_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    return datetime.utcnow() - timedelta(days=days)
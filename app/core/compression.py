@@ -0,0 +1,227 @@
+import time
+import zlib
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core import metrics
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional
+    zstandard = None
+
+# Content types worth compressing; everything else (images, archives,
+# event streams) passes through untouched.
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/csv",
+)
+
+
+class _GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        body = self._compressor.compress(data)
+        return body + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class _BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        body = self._compressor.process(data)
+        return body + (self._compressor.finish() if final else self._compressor.flush())
+
+
+class _ZstdCompressor:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(
+            level=settings.COMPRESSION_ZSTD_LEVEL
+        ).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        body = self._compressor.compress(data)
+        if final:
+            return body + self._compressor.flush()
+        return body + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+def available_encodings() -> dict:
+    """Supported encodings in server preference order."""
+    encodings = {}
+    if zstandard is not None:
+        encodings["zstd"] = _ZstdCompressor
+    if brotli is not None:
+        encodings["br"] = _BrotliCompressor
+    encodings["gzip"] = _GzipCompressor
+    return encodings
+
+
+def negotiate_encoding(accept_encoding: str, encodings: dict):
+    """Pick the client's highest-q encoding, breaking ties by server preference."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        weights[coding] = quality
+    best = None
+    for coding in encodings:
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality <= 0:
+            continue
+        if best is None or quality > best[0]:
+            best = (quality, coding)
+    return best[1] if best else None
+
+
+class CompressionMiddleware:
+    """Negotiated zstd/br/gzip compression for dynamic responses.
+
+    Small bodies are sent as-is.  Streamed bodies are buffered only until they
+    reach the minimum size, then compressed chunk by chunk with a flush per
+    chunk so clients still receive data incrementally.  Large chunks are
+    compressed in a worker thread to keep the event loop responsive.
+    """
+
+    def __init__(self, app, excluded_prefixes=("/static",)):
+        self.app = app
+        self.encodings = available_encodings()
+        self.excluded_prefixes = tuple(excluded_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not settings.COMPRESSION_ENABLED
+            or scope["path"].startswith(self.excluded_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self.app, encoding, self.encodings[encoding])
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    def __init__(self, app, encoding: str, compressor_class):
+        self.app = app
+        self.encoding = encoding
+        self.compressor_class = compressor_class
+        self.compressor = None
+        self.send = None
+        self.start_message = None
+        self.passthrough = False
+        self.buffer = bytearray()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _should_compress(self, message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 304):
+            return False
+        headers = Headers(raw=message["headers"])
+        if "content-encoding" in headers:
+            return False
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return media_type in COMPRESSIBLE_TYPES
+
+    async def _compress(self, data: bytes, final: bool) -> bytes:
+        def run():
+            started = time.thread_time()
+            body = self.compressor.compress(data, final)
+            return body, time.thread_time() - started
+
+        if len(data) >= settings.COMPRESSION_THREAD_THRESHOLD:
+            body, cpu = await anyio.to_thread.run_sync(run)
+        else:
+            body, cpu = run()
+        self.bytes_in += len(data)
+        self.bytes_out += len(body)
+        self.cpu_seconds += cpu
+        return body
+
+    def _start_compressing(self) -> None:
+        self.compressor = self.compressor_class()
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        del headers["content-length"]
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+    def _record(self) -> None:
+        metrics.increment("compression.bytes_in", self.bytes_in, encoding=self.encoding)
+        metrics.increment("compression.bytes_out", self.bytes_out, encoding=self.encoding)
+        if self.bytes_out:
+            metrics.observe("compression.ratio", self.bytes_in / self.bytes_out, encoding=self.encoding)
+        metrics.observe("compression.cpu_ms", self.cpu_seconds * 1000, encoding=self.encoding)
+
+    async def send_wrapper(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._should_compress(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.buffer.extend(body)
+            if more_body and len(self.buffer) < settings.COMPRESSION_MINIMUM_SIZE:
+                return
+            if not more_body and len(self.buffer) < settings.COMPRESSION_MINIMUM_SIZE:
+                # Too small to be worth it: send the original response.  A
+                # larger one from the same URL may be compressed, so shared
+                # caches must still key on Accept-Encoding
+                MutableHeaders(raw=self.start_message["headers"]).add_vary_header("Accept-Encoding")
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": bytes(self.buffer)})
+                return
+            self._start_compressing()
+            body = bytes(self.buffer)
+            self.buffer.clear()
+            compressed = await self._compress(body, final=not more_body)
+            if not more_body:
+                headers = MutableHeaders(raw=self.start_message["headers"])
+                headers["Content-Length"] = str(len(compressed))
+            await self.send(self.start_message)
+        else:
+            compressed = await self._compress(body, final=not more_body)
+
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+        if not more_body:
+            self._record()
@@ -1,8 +1,9 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic_settings import BaseSettings
 from pydantic import PostgresDsn, validator
 import secrets
 import json
+import time
 
 
 class Settings(BaseSettings):
@@ -13,12 +14,125 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     
     POSTGRES_SERVER: str = "localhost"
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "postgres"
     POSTGRES_DB: str = "app"
-    DATABASE_URL: Optional[PostgresDsn] = None
+    # Any SQLAlchemy URL; sqlite:/// works for local runs and benchmarks
+    DATABASE_URL: Optional[str] = None
+
+    # Idempotency-Key support on POST endpoints: how long and how much to keep,
+    # and how long a duplicate waits for the original request to finish
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    IDEMPOTENCY_MAX_BYTES: int = 64 * 1024 * 1024
+    IDEMPOTENCY_WAIT_SECONDS: int = 60
+
+    # Largest id/code list accepted by the multi-get lookup endpoints
+    LOOKUP_MAX_KEYS: int = 1000
+
+    # How long a user's company memberships are cached per worker
+    MEMBERSHIP_CACHE_TTL_SECONDS: int = 60
+
+    # Change feed: per-subscriber buffer before a slow client is disconnected,
+    # idle heartbeat interval, and Postgres LISTEN/NOTIFY for cross-worker delivery
+    EVENTS_QUEUE_SIZE: int = 1000
+    EVENTS_HEARTBEAT_SECONDS: int = 15
+    EVENTS_PG_NOTIFY: bool = False
+
+    # Background reclaim of deleted products and companies: products per chunk,
+    # pause between chunks, idle poll interval, and when a running job whose
+    # worker stopped updating it is picked up again
+    RECLAIM_ENABLED: bool = True
+    RECLAIM_BATCH_SIZE: int = 100
+    RECLAIM_PAUSE_SECONDS: float = 0.5
+    RECLAIM_POLL_SECONDS: int = 30
+    RECLAIM_STALE_SECONDS: int = 300
+
+    # Cold item archive: items older than ITEM_ARCHIVE_AFTER_DAYS move to
+    # compressed segment files; decoded segment columns cached per worker
+    ITEM_ARCHIVE_DIR: str = "archive"
+    ITEM_ARCHIVE_AFTER_DAYS: int = 180
+    ITEM_ARCHIVE_SEGMENT_ROWS: int = 50000
+    ITEM_ARCHIVE_CACHE_COLUMNS: int = 16
+
+    # Item table maintenance (python -m app.maintenance): tables altered in
+    # parallel, lock wait per DDL statement on Postgres, and attempts before a
+    # table is marked failed
+    ITEM_MAINTENANCE_WORKERS: int = 4
+    ITEM_MAINTENANCE_LOCK_TIMEOUT_MS: int = 5000
+    ITEM_MAINTENANCE_ATTEMPTS: int = 3
+
+    # Item sharding: extra databases for items_* tables as {"name": url}; the
+    # main database is shard "default".  New products are spread over
+    # ITEM_SHARD_NEW_PRODUCTS (every shard when empty).  Moving a product
+    # (python -m app.shards) waits ITEM_SHARD_SETTLE_SECONDS, which must exceed
+    # PRODUCT_CACHE_TTL_SECONDS, for every worker to see each step
+    ITEM_SHARD_URLS: Dict[str, str] = {}
+    ITEM_SHARD_NEW_PRODUCTS: List[str] = []
+    ITEM_SHARD_SETTLE_SECONDS: int = 40
+    ITEM_SHARD_MOVE_BATCH_ROWS: int = 5000
+
+    # Connection pool; DB_POOL_PREWARM connections are opened during warm-up
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_PREWARM: int = 0
+
+    # Cold start: OpenAPI document generated at build time (python -m app.openapi),
+    # and how many recently updated products warm-up loads into the product cache
+    OPENAPI_CACHE_PATH: Optional[str] = None
+    WARMUP_PRODUCTS: int = 200
+    PRODUCT_CACHE_TTL_SECONDS: int = 30
+    PRODUCT_CACHE_MAX_ENTRIES: int = 10000
+
+    # Production server (python -m app.server); WEB_CONCURRENCY defaults to CPU count
+    WEB_CONCURRENCY: Optional[int] = None
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8080
+    SERVER_KEEP_ALIVE: int = 5
+    SERVER_BACKLOG: int = 2048
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+
+    # Statements slower than this are logged with their EXPLAIN plan (0 disables)
+    SLOW_QUERY_THRESHOLD_MS: int = 200
+    SLOW_QUERY_LOG_SIZE: int = 100
+    SLOW_QUERY_EXPLAIN: bool = True
+    # The same statement text is explained at most once per interval
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: int = 60
+
+    # Response compression; responses smaller than the minimum are sent as-is
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Chunks at least this large are compressed off the event loop
+    COMPRESSION_THREAD_THRESHOLD: int = 256 * 1024
+
+    # Admission control: per-class overrides of the concurrent and queued request
+    # limits in app/core/admission.py, e.g. {"batch": 4}; by default concurrency
+    # is a share of DB_POOL_SIZE + DB_MAX_OVERFLOW.  Queued requests give up
+    # with 503 after the timeout
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_CONCURRENCY: Dict[str, int] = {}
+    ADMISSION_QUEUE: Dict[str, int] = {}
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10
+    ADMISSION_RETRY_AFTER_SECONDS: int = 2
+
+    # Uploaded images: originals and resized variants under IMAGE_DIR.  Variants
+    # come in IMAGE_VARIANT_WIDTHS only, IMAGE_THUMBNAIL_WIDTHS are rendered
+    # right after upload, and the least recently served are evicted beyond
+    # IMAGE_VARIANT_CACHE_BYTES.  Rendering needs Pillow and runs in
+    # IMAGE_WORKERS processes per app worker
+    IMAGE_DIR: str = "images"
+    IMAGE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    IMAGE_VARIANT_WIDTHS: List[int] = [64, 128, 256, 512, 1024]
+    IMAGE_THUMBNAIL_WIDTHS: List[int] = [128]
+    IMAGE_VARIANT_CACHE_BYTES: int = 1024 * 1024 * 1024
+    IMAGE_WORKERS: int = 2
 
     BACKEND_CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8000"]
 
@@ -26,17 +140,29 @@ class Settings(BaseSettings):
     def assemble_db_connection(cls, v: Optional[str], values: dict[str, any]) -> any:
         if isinstance(v, str):
             return v
-        return PostgresDsn.build(
+        return str(PostgresDsn.build(
             scheme="postgresql",
             username=values.get("POSTGRES_USER"),
             password=values.get("POSTGRES_PASSWORD"),
             host=values.get("POSTGRES_SERVER"),
-            path=f"/{values.get('POSTGRES_DB') or ''}",
-        )
+            path=values.get("POSTGRES_DB") or "",
+        ))
+
+    @validator("PRODUCT_CACHE_TTL_SECONDS")
+    def settle_outlasts_product_cache(cls, v: int, values: dict[str, any]) -> int:
+        # A shard move is only safe once every worker's cached placement has
+        # expired; without shards there is nothing to move
+        settle = values.get("ITEM_SHARD_SETTLE_SECONDS")
+        if values.get("ITEM_SHARD_URLS") and settle is not None and settle <= v:
+            raise ValueError("ITEM_SHARD_SETTLE_SECONDS must exceed PRODUCT_CACHE_TTL_SECONDS")
+        return v
 
     class Config:
         case_sensitive = True
         env_file = ".env"
 
 
-settings = Settings() 
\ No newline at end of file
+_settings_started = time.perf_counter()
+settings = Settings()
+# Reported in the startup profile
+settings_load_seconds = time.perf_counter() - _settings_started 
\ No newline at end of file
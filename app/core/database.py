@@ -1,18 +1,141 @@
+import asyncio
+import functools
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.core import pool_metrics, profiler, slow_query
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """The app's engine, created on first use.
+
+    The app creates it in its lifespan hook; scripts and workers get it the
+    first time they need it.  Nothing is created at import time.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_engine(settings.DATABASE_URL)
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def build_engine(url: str) -> Engine:
+    """An engine with the app's pool settings and query instrumentation."""
+    kwargs = {}
+    if url.startswith("sqlite"):
+        # Sessions are used from Starlette's threadpool
+        kwargs["connect_args"] = {"check_same_thread": False}
+    else:
+        kwargs["pool_size"] = settings.DB_POOL_SIZE
+        kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+    engine = create_engine(url, **kwargs)
+    slow_query.install(engine)
+    pool_metrics.install(engine)
+    return engine
+
+
+def prewarm_pool(connections: int) -> int:
+    """Open up to `connections` pooled connections now instead of on first requests."""
+    engine = get_engine()
+    opened = []
+    try:
+        for _ in range(min(connections, settings.DB_POOL_SIZE)):
+            opened.append(engine.connect())
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+
+class _SessionFactory(sessionmaker):
+    def __call__(self, **local_kw):
+        get_engine()
+        return super().__call__(**local_kw)
+
 
-engine = create_engine(str(settings.DATABASE_URL))
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay readable after commit, so responses can be serialized after
+# the session has been closed
+SessionLocal = _SessionFactory(autocommit=False, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
+# Sessions opened by get_db for the request being served, so
+# SessionReleaseRoute can close them as soon as the endpoint returns.  The
+# list is created per request and shared with threadpool threads by reference.
+_request_sessions: ContextVar[Optional[list]] = ContextVar("request_sessions", default=None)
+
 # Dependency
 def get_db():
     db = SessionLocal()
+    sessions = _request_sessions.get()
+    if sessions is not None:
+        sessions.append(db)
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+
+def _release_sessions() -> None:
+    for db in _request_sessions.get() or ():
+        # Ends the transaction and returns its connection to the pool; loaded
+        # objects stay usable for serialization
+        db.close()
+
+
+def _release_after(endpoint):
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def release_after_async(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _release_sessions()
+        return release_after_async
+
+    @functools.wraps(endpoint)
+    def release_after(*args, **kwargs):
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _release_sessions()
+    return release_after
+
+
+class SessionReleaseRoute(profiler.ProfiledRoute):
+    """Closes the request's sessions when the endpoint returns.
+
+    FastAPI tears dependencies down only after the response has been
+    validated and serialized, so get_db alone keeps a pooled connection for
+    the whole response.  Sessions check out a connection on their first query
+    and this route gives it back before serialization starts.  Requests can
+    also be sampled by the profiler (see app.core.profiler).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependant.call = _release_after(self.dependant.call)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            token = _request_sessions.set([])
+            try:
+                return await handler(request)
+            finally:
+                _request_sessions.reset(token)
+
+        return route_handler
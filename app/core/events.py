@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger("app.events")
+
+PG_CHANNEL = "item_events"
+# Identifies this worker so it can ignore its own NOTIFY messages.  Derived
+# per process because the app module may be imported before workers fork.
+_worker_id = (None, None)
+# Batch events carry the item ids only up to this many items
+MAX_BATCH_EVENT_IDS = 100
+
+_CLOSE = object()
+
+
+class Subscription:
+    def __init__(self, channels: tuple, loop: asyncio.AbstractEventLoop):
+        self.channels = channels
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        self.dropped = False
+
+    def offer(self, payload: str) -> None:
+        """Runs on the subscriber's loop.  A full queue means a slow consumer."""
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped = True
+            metrics.increment("events.slow_consumer_disconnects")
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_CLOSE)
+
+
+class Broadcaster:
+    """In-process fan-out of change events to SSE subscribers.
+
+    Publishing is thread-safe: the sync write handlers run in the threadpool
+    and hand each payload to the subscriber's event loop.  The payload is
+    serialized once per event no matter how many subscribers there are.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels: tuple) -> Subscription:
+        subscription = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish_local(self, channels: tuple, payload: str) -> None:
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.loop.call_soon_threadsafe(subscription.offer, payload)
+        metrics.increment("events.published")
+
+
+broadcaster = Broadcaster()
+
+
+def worker_id() -> str:
+    global _worker_id
+    pid, identifier = _worker_id
+    if pid != os.getpid():
+        pid = os.getpid()
+        identifier = f"{pid}-{uuid.uuid4().hex[:8]}"
+        _worker_id = (pid, identifier)
+    return identifier
+
+
+def item_channels(product_id: int, company_id: str) -> tuple:
+    return (f"product:{product_id}", f"company:{company_id}")
+
+
+def _pg_notify_enabled(db: Session) -> bool:
+    return settings.EVENTS_PG_NOTIFY and db.get_bind().dialect.name == "postgresql"
+
+
+def publish_item_event(
+    db: Session, event_type: str, product_id: int, company_id: str, data: dict
+) -> None:
+    """Publish an item change to this worker's subscribers and, optionally, other workers.
+
+    Call after the change is committed.
+    """
+    channels = item_channels(product_id, company_id)
+    payload = json.dumps(
+        {
+            "type": event_type,
+            "product_id": product_id,
+            "company_id": company_id,
+            "data": data,
+            "at": datetime.utcnow().isoformat(),
+        },
+        default=str,
+    )
+    broadcaster.publish_local(channels, payload)
+    if _pg_notify_enabled(db):
+        message = json.dumps({"origin": worker_id(), "channels": channels, "payload": payload})
+        db.execute(text("SELECT pg_notify(:channel, :message)"), {"channel": PG_CHANNEL, "message": message})
+        db.commit()
+
+
+def batch_event_data(items: list, box_key: str) -> dict:
+    data = {"count": len(items), "box_key": box_key}
+    if len(items) <= MAX_BATCH_EVENT_IDS:
+        data["ids"] = [item["id"] for item in items]
+    return data
+
+
+async def event_stream(channels: tuple) -> AsyncIterator[str]:
+    """Server-sent events for the given channels, with heartbeats while idle."""
+    subscription = broadcaster.subscribe(channels)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if payload is _CLOSE:
+                yield "event: overflow\ndata: {}\n\n"
+                return
+            yield f"data: {payload}\n\n"
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+class PgNotifyListener(threading.Thread):
+    """Relays item events NOTIFYed by other workers to local subscribers."""
+
+    def __init__(self, engine):
+        super().__init__(name="events-pg-listener", daemon=True)
+        self.engine = engine
+        self.stopping = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                self._listen()
+            except Exception:
+                logger.exception("LISTEN %s failed, reconnecting", PG_CHANNEL)
+                self.stopping.wait(5)
+
+    def _listen(self) -> None:
+        connection = self.engine.connect()
+        # Keep this connection out of the pool: it lives as long as the worker
+        connection.detach()
+        dbapi_connection = connection.connection.driver_connection
+        try:
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {PG_CHANNEL}")
+            while not self.stopping.is_set():
+                if select.select([dbapi_connection], [], [], 5) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    message = json.loads(notify.payload)
+                    if message["origin"] != worker_id():
+                        broadcaster.publish_local(tuple(message["channels"]), message["payload"])
+        finally:
+            connection.close()
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+
+_listener: Optional[PgNotifyListener] = None
+
+
+def start_listener(engine) -> None:
+    global _listener
+    if settings.EVENTS_PG_NOTIFY and engine.dialect.name == "postgresql" and _listener is None:
+        _listener = PgNotifyListener(engine)
+        _listener.start()
+
+
+def stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from app.core import metrics, security
+from app.core.config import settings
+
+# POST endpoints whose retries are deduplicated
+IDEMPOTENT_PATHS = re.compile(
+    rf"^{re.escape(settings.API_V1_STR)}/(items|products|companies)(/|$)"
+)
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "done", "expires_at", "status", "headers", "body")
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.expires_at = time.monotonic() + settings.IDEMPOTENCY_TTL_SECONDS
+        self.status = None
+        self.headers = None
+        self.body = b""
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers or ())
+
+
+class IdempotencyStore:
+    """LRU of recent idempotent requests, bounded by entry count and body bytes.
+
+    Lives in one worker; retries that land on another worker are not
+    deduplicated.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+    def get(self, key: tuple) -> Optional[_Entry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.done.is_set() and entry.expires_at < time.monotonic():
+            self.discard(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def begin(self, key: tuple, fingerprint: str) -> _Entry:
+        entry = _Entry(fingerprint)
+        self.entries[key] = entry
+        return entry
+
+    def complete(self, key: tuple, entry: _Entry) -> None:
+        entry.done.set()
+        if self.entries.get(key) is not entry:
+            # Expired and replaced meanwhile; waiters still get it
+            return
+        if entry.size > self.max_bytes:
+            # Keeping it would evict every other entry; waiters still get it
+            del self.entries[key]
+            metrics.increment("idempotency.too_large")
+            return
+        self.bytes += entry.size
+        self._evict()
+
+    def discard(self, key: tuple, entry: Optional[_Entry] = None) -> None:
+        """Drop the entry under key, only if it is still `entry` when one is given."""
+        current = self.entries.get(key)
+        if current is None or (entry is not None and current is not entry):
+            return
+        del self.entries[key]
+        if current.done.is_set():
+            self.bytes -= current.size
+
+    def _evict(self) -> None:
+        # Least recently used first; entries still executing are never evicted
+        for key in list(self.entries):
+            if len(self.entries) <= self.max_entries and self.bytes <= self.max_bytes:
+                return
+            if self.entries[key].done.is_set():
+                self.discard(key)
+                metrics.increment("idempotency.evictions")
+
+
+class IdempotencyMiddleware:
+    """Replays the stored response for a repeated Idempotency-Key.
+
+    The key is scoped to the authenticated user (the access token's subject),
+    so a retry after refreshing the token still matches.  A concurrent
+    duplicate waits for the first execution instead of running again; reusing
+    a key for a different request body is rejected with 422.  Server errors
+    and responses that were not sent in full are not stored; of the
+    duplicates waiting on such a request, one runs it again and the rest
+    wait for that run.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.store = IdempotencyStore(settings.IDEMPOTENCY_MAX_ENTRIES, settings.IDEMPOTENCY_MAX_BYTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not IDEMPOTENT_PATHS.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > 255:
+            await JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)(scope, receive, send)
+            return
+
+        body, receive = await _buffer_body(receive)
+        key = (_principal(headers.get("authorization", "")), idempotency_key)
+        fingerprint = hashlib.sha256(
+            b"\0".join([scope["path"].encode(), scope.get("query_string", b""), body])
+        ).hexdigest()
+
+        while True:
+            entry = self.store.get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used for a different request"},
+                    status_code=422,
+                )
+                await response(scope, receive, send)
+                return
+            if not entry.done.is_set():
+                metrics.increment("idempotency.waits")
+                try:
+                    await asyncio.wait_for(entry.done.wait(), settings.IDEMPOTENCY_WAIT_SECONDS)
+                except asyncio.TimeoutError:
+                    response = JSONResponse(
+                        {"detail": "A request with this Idempotency-Key is still in progress"},
+                        status_code=409,
+                    )
+                    await response(scope, receive, send)
+                    return
+            if entry.status is not None:
+                metrics.increment("idempotency.replays")
+                response = Response(entry.body, status_code=entry.status)
+                response.raw_headers = entry.headers + [
+                    (b"content-length", str(len(entry.body)).encode()),
+                    (b"idempotent-replayed", b"true"),
+                ]
+                await response(scope, receive, send)
+                return
+            # The attempt failed and was discarded.  Look again: another
+            # waiter may already have started the retry, and then this one
+            # waits for it instead of running it too
+
+        entry = self.store.begin(key, fingerprint)
+        captured = {"status": None, "headers": [], "body": bytearray(), "complete": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                captured["body"].extend(message.get("body", b""))
+                if not message.get("more_body", False):
+                    captured["complete"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            # A response cut short by an error or a disconnect is not replayed
+            if captured["complete"] and captured["status"] < 500:
+                entry.status = captured["status"]
+                entry.headers = [
+                    (name, value) for name, value in captured["headers"] if name.lower() != b"content-length"
+                ]
+                entry.body = bytes(captured["body"])
+                self.store.complete(key, entry)
+            else:
+                self.store.discard(key, entry)
+                entry.done.set()
+
+
+def _principal(authorization: str) -> str:
+    """Who an idempotency key belongs to: the token's user, or the raw header
+    for requests whose token does not validate (they are rejected anyway)."""
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer":
+        subject = security.token_subject(token)
+        if subject is not None:
+            return f"user:{subject}"
+    return "header:" + hashlib.sha256(authorization.encode()).hexdigest()
+
+
+async def _buffer_body(receive):
+    """Read the whole request body and return it with a receive that replays it."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay
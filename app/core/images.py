@@ -0,0 +1,351 @@
+"""Uploaded images and their resized variants.
+
+Originals are stored once per content under IMAGE_DIR/originals, named by the
+SHA-256 of their bytes, so an image id is also an unguessable, permanent URL.
+Variants (an allowed width in webp, jpeg or png) are rendered by a process
+pool, so decoding and resizing never run on the event loop or hold the GIL of
+the app worker, and are cached under IMAGE_DIR/variants.  The variant cache
+is bounded by IMAGE_VARIANT_CACHE_BYTES and evicts the least recently served
+files first; recency is the file's mtime, so workers sharing the directory
+agree on it.
+
+Rendering needs Pillow.  Without it, variant URLs serve the original.
+"""
+import asyncio
+import functools
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Dict, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # resizing is optional
+    Image = None
+
+logger = logging.getLogger("app.images")
+
+IMAGE_ID = re.compile(r"^[0-9a-f]{64}$")
+VARIANT_FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+THUMBNAIL_FORMAT = "webp"
+# A served variant's mtime is bumped at most this often
+TOUCH_INTERVAL_SECONDS = 3600
+# Eviction frees down to this share of the budget, so it does not run on every write
+EVICT_TO = 0.9
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Content type from an image's first bytes, for the formats accepted on upload."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _originals_dir() -> str:
+    return os.path.join(settings.IMAGE_DIR, "originals")
+
+
+def _variants_dir() -> str:
+    return os.path.join(settings.IMAGE_DIR, "variants")
+
+
+def original_path(image_id: str) -> str:
+    return os.path.join(_originals_dir(), image_id[:2], image_id)
+
+
+def variant_path(image_id: str, width: int, fmt: str) -> str:
+    return os.path.join(_variants_dir(), image_id[:2], f"{image_id}-{width}.{fmt}")
+
+
+def image_url(image_id: str) -> str:
+    return f"{settings.API_V1_STR}/images/{image_id}"
+
+
+def variant_url(image_id: str, width: int, fmt: str = THUMBNAIL_FORMAT) -> str:
+    return f"{image_url(image_id)}/{width}.{fmt}"
+
+
+def save_original(upload: BinaryIO) -> tuple:
+    """Store an uploaded image; return (image_id, content_type, size).
+
+    Reads in chunks up to IMAGE_MAX_UPLOAD_BYTES.  Uploading the same bytes
+    again stores nothing new.
+    """
+    os.makedirs(_originals_dir(), exist_ok=True)
+    tmp_path = os.path.join(_originals_dir(), f".upload-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+    try:
+        with open(tmp_path, "wb") as tmp_file:
+            while True:
+                chunk = upload.read(64 * 1024)
+                if not chunk:
+                    break
+                if content_type is None:
+                    content_type = sniff_content_type(chunk[:16])
+                    if content_type is None:
+                        raise InvalidImage("Only JPEG, PNG, GIF and WebP images are accepted")
+                size += len(chunk)
+                if size > settings.IMAGE_MAX_UPLOAD_BYTES:
+                    raise InvalidImage(f"Images are limited to {settings.IMAGE_MAX_UPLOAD_BYTES} bytes")
+                digest.update(chunk)
+                tmp_file.write(chunk)
+        if content_type is None:
+            raise InvalidImage("The image is empty")
+        image_id = digest.hexdigest()
+        path = original_path(image_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    metrics.increment("images.uploads")
+    return image_id, content_type, size
+
+
+def original_content_type(image_id: str) -> Optional[str]:
+    """Content type of a stored original, or None if there is no such image."""
+    try:
+        with open(original_path(image_id), "rb") as original:
+            return sniff_content_type(original.read(16))
+    except FileNotFoundError:
+        return None
+
+
+def render_variant(source: str, target: str, width: int, fmt: str, max_pixels: int) -> int:
+    """Resize source to width (never enlarging) and write it to target; return its size.
+
+    Runs in a pool process.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp_path, format=fmt.upper(), quality=82, optimize=True)
+    os.replace(tmp_path, target)
+    return os.path.getsize(target)
+
+
+class VariantCache:
+    """Rendered variants on disk, bounded by a byte budget, least recently served evicted first.
+
+    Each worker keeps a running total of what it knows is on disk and rescans
+    the directory when the total crosses the budget.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bytes = None
+        self.lock = threading.Lock()
+
+    def _files(self) -> list:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    # Still being written
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def touch(self, path: str, mtime: float) -> None:
+        """Mark a variant as recently served."""
+        if time.time() - mtime > TOUCH_INTERVAL_SECONDS:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+    def added(self, size: int) -> None:
+        with self.lock:
+            if self.bytes is None:
+                self.bytes = sum(file_size for _, file_size, _ in self._files())
+            else:
+                self.bytes += size
+            if self.bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            metrics.increment("images.variant_evictions")
+        self.bytes = total
+
+
+variant_cache = VariantCache(_variants_dir(), settings.IMAGE_VARIANT_CACHE_BYTES)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# variant path -> render in progress, so concurrent misses render once
+_rendering: Dict[str, Future] = {}
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Not forked: the app worker has threads and open connections
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Replace a pool broken by a dead render process; the next render starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    metrics.increment("images.pool_restarts")
+
+
+def resizing_available() -> bool:
+    return Image is not None
+
+
+def render(image_id: str, width: int, fmt: str) -> Future:
+    """Render a variant in the process pool; the future's result is its path."""
+    path = variant_path(image_id, width, fmt)
+    with _pool_lock:
+        pending = _rendering.get(path)
+        if pending is not None:
+            return pending
+        result = Future()
+        _rendering[path] = result
+    started = time.perf_counter()
+
+    def fail(error: Optional[BaseException]) -> None:
+        with _pool_lock:
+            _rendering.pop(path, None)
+        if error is None:
+            # Cancelled by shutdown
+            result.cancel()
+        else:
+            result.set_exception(error)
+
+    def submit(retry: bool) -> None:
+        pool = _get_pool()
+        try:
+            rendered = pool.submit(
+                render_variant, original_path(image_id), path, width, fmt, settings.IMAGE_MAX_PIXELS
+            )
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if not retry:
+                raise
+            submit(retry=False)
+            return
+        rendered.add_done_callback(functools.partial(finished, pool, retry))
+
+    def finished(pool: ProcessPoolExecutor, retry: bool, rendered: Future) -> None:
+        if rendered.cancelled():
+            fail(None)
+            return
+        error = rendered.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A render process died, possibly on another image; try once more
+            # in a new pool
+            _discard_pool(pool)
+            if retry:
+                try:
+                    submit(retry=False)
+                except Exception as exc:
+                    fail(exc)
+                return
+        if error is not None:
+            fail(error)
+            return
+        with _pool_lock:
+            _rendering.pop(path, None)
+        metrics.observe("images.render_ms", (time.perf_counter() - started) * 1000, width=str(width))
+        try:
+            variant_cache.added(rendered.result())
+        except OSError:
+            logger.exception("Evicting image variants failed")
+        result.set_result(path)
+
+    try:
+        submit(retry=True)
+    except Exception as exc:
+        fail(exc)
+    return result
+
+
+def render_thumbnails(image_id: str) -> None:
+    """Start rendering the IMAGE_THUMBNAIL_WIDTHS variants of a new upload."""
+    if not resizing_available():
+        return
+    for width in settings.IMAGE_THUMBNAIL_WIDTHS:
+        if not os.path.exists(variant_path(image_id, width, THUMBNAIL_FORMAT)):
+            render(image_id, width, THUMBNAIL_FORMAT)
+
+
+async def get_variant(image_id: str, width: int, fmt: str) -> Optional[tuple]:
+    """Path and stat of a variant, rendering it on a miss; None if the image does not exist."""
+    path = variant_path(image_id, width, fmt)
+    try:
+        stat = os.stat(path)
+        metrics.increment("images.variant_hits")
+        variant_cache.touch(path, stat.st_mtime)
+        return path, stat
+    except FileNotFoundError:
+        pass
+    if not os.path.exists(original_path(image_id)):
+        return None
+    metrics.increment("images.variant_misses")
+    await asyncio.wrap_future(render(image_id, width, fmt))
+    return path, os.stat(path)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
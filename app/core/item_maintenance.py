@@ -0,0 +1,203 @@
+"""Bring every items_{product_id} table up to the declared item schema.
+
+Item tables are created on demand, one per product, so Alembic migrations do
+not reach them.  Maintenance discovers them in every shard, compares each
+with item_tables.items_table_definition and applies what is missing: new
+columns with ALTER TABLE ... ADD COLUMN and new indexes with CREATE INDEX
+(CONCURRENTLY on Postgres, so writes continue while the index builds).
+
+Tables are altered in parallel by a bounded pool of threads, each with its
+own connection.  On Postgres every statement runs with a lock timeout, so a
+table held by a long transaction is retried later instead of queueing every
+writer behind the DDL.  Progress is recorded per shard and table in
+item_table_schemas; a rerun skips tables already at item_tables.SCHEMA_VERSION
+and retries the ones that failed.
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from app.core import item_tables, metrics, shards
+from app.core.config import settings
+from app.core.database import SessionLocal, get_engine
+from app.core.models import ItemTableSchema
+
+logger = logging.getLogger("app.item_maintenance")
+
+ITEM_TABLE_NAME = re.compile(r"^items_(\d+)$")
+
+
+def discover(connection: Connection) -> List[int]:
+    """Product ids of every item table in the database."""
+    product_ids = []
+    for name in inspect(connection).get_table_names():
+        match = ITEM_TABLE_NAME.match(name)
+        if match:
+            product_ids.append(int(match.group(1)))
+    return sorted(product_ids)
+
+
+def _invalid_indexes(connection: Connection, table_name: str) -> List[str]:
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind
+    # that is never used but still maintained on every write
+    if connection.dialect.name != "postgresql":
+        return []
+    rows = connection.execute(
+        text(
+            "SELECT index_class.relname FROM pg_index"
+            " JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid"
+            " JOIN pg_class table_class ON table_class.oid = pg_index.indrelid"
+            " WHERE table_class.relname = :table_name AND NOT pg_index.indisvalid"
+        ),
+        {"table_name": table_name},
+    )
+    return [name for (name,) in rows]
+
+
+def pending_statements(connection: Connection, product_id: int) -> List[str]:
+    """DDL that brings one item table up to the target schema, in order."""
+    dialect = connection.dialect
+    quote = dialect.identifier_preparer.quote
+    target = item_tables.items_table_definition(product_id)
+    inspector = inspect(connection)
+
+    statements = []
+    invalid = _invalid_indexes(connection, target.name)
+    for name in invalid:
+        statements.append(f"DROP INDEX CONCURRENTLY IF EXISTS {quote(name)}")
+
+    existing_columns = {column["name"] for column in inspector.get_columns(target.name)}
+    for column in target.columns:
+        if column.name not in existing_columns:
+            column_ddl = CreateColumn(column).compile(dialect=dialect)
+            statements.append(f"ALTER TABLE {quote(target.name)} ADD COLUMN {column_ddl}")
+
+    existing_indexes = {index["name"] for index in inspector.get_indexes(target.name)} - set(invalid)
+    for index in sorted(target.indexes, key=lambda index: index.name):
+        if index.name not in existing_indexes:
+            if dialect.name == "postgresql":
+                index.dialect_options["postgresql"]["concurrently"] = True
+            statements.append(str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)))
+    return statements
+
+
+def _record(shard: str, product_id: int, status: str, error: Optional[str] = None) -> None:
+    db = SessionLocal()
+    try:
+        db.merge(ItemTableSchema(
+            shard=shard, product_id=product_id, version=item_tables.SCHEMA_VERSION, status=status, error=error,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def migrate_table(product_id: int, shard: str = shards.DEFAULT_SHARD, dry_run: bool = False) -> List[str]:
+    """Apply the missing DDL to one item table; return the statements.
+
+    Statements run one at a time outside a transaction, which CREATE INDEX
+    CONCURRENTLY requires, and each is safe to repeat, so a table interrupted
+    halfway is finished by the next run.  Lock timeouts are retried with
+    backoff up to ITEM_MAINTENANCE_ATTEMPTS times.
+    """
+    attempt = 1
+    while True:
+        try:
+            with shards.get_shard_engine(shard).connect() as connection:
+                connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+                if connection.dialect.name == "postgresql":
+                    connection.execute(text(f"SET lock_timeout = {int(settings.ITEM_MAINTENANCE_LOCK_TIMEOUT_MS)}"))
+                    # Building an index on a large table may take a while
+                    connection.execute(text("SET statement_timeout = 0"))
+                statements = pending_statements(connection, product_id)
+                if dry_run:
+                    return statements
+                for statement in statements:
+                    started = time.perf_counter()
+                    connection.execute(text(statement))
+                    metrics.observe("item_maintenance.statement_ms", (time.perf_counter() - started) * 1000)
+            return statements
+        except DBAPIError:
+            if attempt >= settings.ITEM_MAINTENANCE_ATTEMPTS:
+                raise
+            logger.warning("Altering items_%s failed, attempt %s", product_id, attempt, exc_info=True)
+            metrics.increment("item_maintenance.retries")
+            time.sleep(attempt)
+            attempt += 1
+
+
+def _up_to_date() -> set:
+    """(shard, product_id) of the tables already at SCHEMA_VERSION."""
+    db = SessionLocal()
+    try:
+        return {
+            (shard, product_id)
+            for shard, product_id in db.query(ItemTableSchema.shard, ItemTableSchema.product_id).filter(
+                ItemTableSchema.version >= item_tables.SCHEMA_VERSION,
+                ItemTableSchema.status == "done",
+            )
+        }
+    finally:
+        db.close()
+
+
+def run(
+    workers: Optional[int] = None,
+    product_ids: Optional[Iterable[int]] = None,
+    dry_run: bool = False,
+    on_table: Optional[Callable[[str, int, str, List[str]], None]] = None,
+) -> dict:
+    """Bring item tables up to SCHEMA_VERSION; return how many ended in each state.
+
+    on_table(shard, product_id, status, statements) is called as each table
+    finishes.
+    """
+    engine = get_engine()
+    ItemTableSchema.__table__.create(engine, checkfirst=True)
+    existing = []
+    for shard in shards.shard_names():
+        with shards.get_shard_engine(shard).connect() as connection:
+            existing.extend((shard, product_id) for product_id in discover(connection))
+    if product_ids is not None:
+        wanted = set(product_ids)
+        existing = [table for table in existing if table[1] in wanted]
+    done = _up_to_date()
+    todo = [table for table in existing if table not in done]
+
+    workers = workers or settings.ITEM_MAINTENANCE_WORKERS
+    if engine.dialect.name == "sqlite":
+        # SQLite takes one writer at a time
+        workers = 1
+    counts = {"skipped": len(existing) - len(todo), "done": 0, "failed": 0}
+
+    def migrate(shard: str, product_id: int) -> List[str]:
+        statements = migrate_table(product_id, shard, dry_run=dry_run)
+        if not dry_run:
+            _record(shard, product_id, "done")
+        return statements
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="item-maintenance") as pool:
+        futures = {pool.submit(migrate, *table): table for table in todo}
+        for future in as_completed(futures):
+            shard, product_id = futures[future]
+            try:
+                statements = future.result()
+                status = "done"
+            except Exception as exc:
+                logger.exception("Altering items_%s failed", product_id)
+                statements = []
+                status = "failed"
+                if not dry_run:
+                    _record(shard, product_id, "failed", str(exc)[:500])
+            counts[status] += 1
+            metrics.increment("item_maintenance.tables", status=status)
+            if on_table is not None:
+                on_table(shard, product_id, status, statements)
+    return counts
@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, text
+from sqlalchemy.orm import Session
+
+from app.core import shards
+
+# Version of items_table_definition.  Bump it whenever the definition changes;
+# python -m app.maintenance brings existing item tables up to it.
+SCHEMA_VERSION = 2
+
+# (shard, product_id) of tables already known to exist in this process.
+# Creating them checks out a second pooled connection, so it must not happen on
+# every request.
+_items_tables = {}
+
+
+def items_table_name(product_id: int) -> str:
+    return f"items_{product_id}"
+
+
+def items_table_definition(product_id: int, metadata: Optional[MetaData] = None) -> Table:
+    """Target schema of a product's item table.
+
+    New tables are created with it as is.  Existing tables only get what is
+    added here through maintenance, so changes must be additive: new columns
+    nullable or with a server default, new indexes named after the table.
+    """
+    name = items_table_name(product_id)
+    return Table(
+        name,
+        metadata if metadata is not None else MetaData(),
+        Column("id", String, primary_key=True),
+        Column("key", String, nullable=False),
+        Column("box_key", String, nullable=False),
+        Column("created_at", DateTime, default=datetime.utcnow, nullable=False),
+        # Lookups by key
+        Index(f"ix_{name}_key", "key"),
+    )
+
+
+def get_items_table(product_id: int, shard: str = shards.DEFAULT_SHARD) -> Table:
+    """Get or create items table for a specific product in its shard."""
+    items_table = _items_tables.get((shard, product_id))
+    if items_table is not None:
+        return items_table
+
+    items_table = items_table_definition(product_id)
+
+    # Create the table if it doesn't exist; an existing table is left to
+    # maintenance, which builds missing indexes without blocking writes
+    items_table.metadata.create_all(shards.get_shard_engine(shard))
+    _items_tables[(shard, product_id)] = items_table
+    return items_table
+
+
+def bind_items_table(db: Session, product) -> Table:
+    """The product's item table, with db's statements on it sent to its shard.
+
+    The session commits the shard's connection together with its own.
+    """
+    items_table = get_items_table(product.id, product.shard)
+    db.bind_table(items_table, shards.get_shard_engine(product.shard))
+    return items_table
+
+
+def drop_items_table(connection, product_id: int, shard: str = shards.DEFAULT_SHARD) -> None:
+    """Drop a product's item table; dropping is cheap however many rows it holds."""
+    _items_tables.pop((shard, product_id), None)
+    name = connection.dialect.identifier_preparer.quote(items_table_name(product_id))
+    connection.execute(text(f"DROP TABLE IF EXISTS {name}"))
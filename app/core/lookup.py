@@ -0,0 +1,47 @@
+from typing import Any, Callable, Iterable, List
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+
+def unique_in_order(values: Iterable) -> list:
+    """Drop repeated values, keeping the first occurrence of each."""
+    return list(dict.fromkeys(values))
+
+
+def resolve_in_order(requested: List[Any], rows: Iterable, key: Callable[[Any], Any]) -> dict:
+    """Match fetched rows back to the requested keys.
+
+    Returns {"items": rows in request order, "missing": keys that had no row}.
+    """
+    by_key = {key(row): row for row in rows}
+    items, missing = [], []
+    for value in requested:
+        row = by_key.get(value)
+        if row is None:
+            missing.append(value)
+        else:
+            items.append(row)
+    return {"items": items, "missing": missing}
+
+
+def lookup_keys(**candidates) -> tuple:
+    """Pick the one key list a lookup request supplied, as (field, unique values).
+
+    Exactly one list must be given and it may hold at most LOOKUP_MAX_KEYS
+    values, counted before duplicates are dropped.
+    """
+    supplied = [(field, values) for field, values in candidates.items() if values is not None]
+    if len(supplied) != 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Provide exactly one of: {', '.join(candidates)}"
+        )
+    field, values = supplied[0]
+    if len(values) > settings.LOOKUP_MAX_KEYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.LOOKUP_MAX_KEYS} {field} per lookup"
+        )
+    return field, unique_in_order(values)
@@ -0,0 +1,75 @@
+import threading
+from collections import deque
+from typing import Optional
+
+# Recent observations kept per series for percentile estimates
+RESERVOIR_SIZE = 1024
+
+_lock = threading.Lock()
+_counters = {}
+_summaries = {}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class _Summary:
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+
+        def quantile(fraction: float) -> Optional[float]:
+            if not recent:
+                return None
+            return recent[min(len(recent) - 1, int(fraction * len(recent)))]
+
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+            "p50": quantile(0.50),
+            "p99": quantile(0.99),
+        }
+
+
+def increment(name: str, amount: float = 1, **labels) -> None:
+    """Add to a monotonically increasing counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one observation (a duration, a size, a ratio) in a summary."""
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = _summaries[key] = _Summary()
+        summary.observe(value)
+
+
+def snapshot() -> dict:
+    """All counters and summaries as plain data, grouped by metric name."""
+    result = {"counters": {}, "summaries": {}}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": value})
+        for (name, labels), summary in _summaries.items():
+            result["summaries"].setdefault(name, []).append({"labels": dict(labels), **summary.snapshot()})
+    return result
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, String, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, String, ForeignKey, Index, LargeBinary, text
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -22,14 +22,24 @@ class User(Base, TimestampMixin):
 
 class Company(Base, TimestampMixin):
     __tablename__ = "companies"
+    __table_args__ = (
+        # Unique among live companies, so a deleted company's code can be reused
+        # before reclaim removes the row
+        Index(
+            "ix_companies_code", "code", unique=True,
+            postgresql_where=text("deleted_at IS NULL"), sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
 
     id = Column(String, primary_key=True, index=True)  # tax_code
-    code = Column(String, unique=True, index=True, nullable=False)
+    code = Column(String, nullable=False)
     logo = Column(String)
     images = Column(String)
     name = Column(String, nullable=False)
     address = Column(String)
     phone = Column(String)
+    # Set on delete; the row and its products are reclaimed in the background
+    deleted_at = Column(DateTime)
 
     # Relationships
     users = relationship("UserCompany", back_populates="company")
@@ -37,6 +47,10 @@ class Company(Base, TimestampMixin):
 
 class UserCompany(Base):
     __tablename__ = "user_companies"
+    __table_args__ = (
+        # Covers the membership lookup (user_id -> company_id) without a heap visit
+        Index("ix_user_companies_user_id_company_id", "user_id", "company_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -48,14 +62,76 @@ class UserCompany(Base):
 
 class Product(Base, TimestampMixin):
     __tablename__ = "products"
+    __table_args__ = (
+        # Tenant-scoped listings filter on company_id and page by id
+        Index("ix_products_company_id_id", "company_id", "id"),
+        # Unique among live products, so a deleted product's code can be reused
+        # before reclaim removes the row
+        Index(
+            "ix_products_code", "code", unique=True,
+            postgresql_where=text("deleted_at IS NULL"), sqlite_where=text("deleted_at IS NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    code = Column(String, unique=True, index=True, nullable=False)
+    code = Column(String, nullable=False)
     thumbnail = Column(String)
     images = Column(String)
     name = Column(String, nullable=False)
     description = Column(String)
     company_id = Column(String, ForeignKey("companies.id"), nullable=False)
+    # Set on delete; the row and its item table are reclaimed in the background
+    deleted_at = Column(DateTime)
 
     # Relationships
-    company = relationship("Company", back_populates="products") 
\ No newline at end of file
+    company = relationship("Company", back_populates="products")
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # SHA-256 of the opaque token; the token itself is never stored
+    token_hash = Column(LargeBinary(32), unique=True, index=True, nullable=False)
+    # Every token descending from one login shares a family, revoked as a unit
+    family_id = Column(String(32), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime)
+
+class ReclaimJob(Base, TimestampMixin):
+    __tablename__ = "reclaim_jobs"
+    __table_args__ = (
+        Index("ix_reclaim_jobs_status_id", "status", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # product, company
+    target_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    total = Column(Integer, nullable=False, default=0)
+    done = Column(Integer, nullable=False, default=0)
+    error = Column(String)
+
+class ItemTableSchema(Base, TimestampMixin):
+    __tablename__ = "item_table_schemas"
+
+    # One row per items_{product_id} table and shard (a product's table exists
+    # in two shards during a move), written by item table maintenance
+    shard = Column(String, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    status = Column(String, nullable=False)  # done, failed
+    error = Column(String)
+
+class ItemShard(Base, TimestampMixin):
+    __tablename__ = "item_shards"
+
+    # Products without a row keep their items in the default shard
+    product_id = Column(Integer, primary_key=True)
+    shard = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="active")  # active, moving
+    # Set while the items are copied to another shard
+    moving_to = Column(String)
+    # Left behind by a finished move until its table is dropped
+    previous_shard = Column(String)
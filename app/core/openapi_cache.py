@@ -0,0 +1,97 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger("app.openapi")
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _source_files(app: FastAPI) -> set:
+    """The app's modules that define the routes' endpoints, dependencies and models."""
+    files = set()
+
+    def add(obj) -> None:
+        try:
+            files.add(inspect.getsourcefile(inspect.unwrap(getattr(obj, "call", obj))))
+        except TypeError:
+            # Builtins and instances of classes defined elsewhere
+            try:
+                files.add(inspect.getsourcefile(type(obj)))
+            except TypeError:
+                pass
+
+    def add_dependant(dependant) -> None:
+        for sub_dependant in dependant.dependencies:
+            add(sub_dependant.call)
+            add_dependant(sub_dependant)
+
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            add(route.endpoint)
+            add_dependant(route.dependant)
+            if inspect.isclass(route.response_model):
+                add(route.response_model)
+    return {path for path in files if path and path.startswith(APP_DIR + os.sep)}
+
+
+def _route_parameters(route: APIRoute) -> str:
+    # Limits and defaults can come from constants in other modules
+    params = []
+    for dependant in [route.dependant] + route.dependant.dependencies:
+        for field in (
+            dependant.path_params + dependant.query_params + dependant.header_params
+            + dependant.cookie_params + dependant.body_params
+        ):
+            params.append(f"{field.name}:{field.field_info!r}")
+    return "\0".join(params)
+
+
+def fingerprint(app: FastAPI) -> str:
+    """Changes whenever a route, its parameters, responses or docstring, the
+    app version, or the source of an endpoint, dependency or model module changes."""
+    digest = hashlib.sha256(f"{app.title}\0{app.version}".encode())
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            digest.update(
+                f"{route.path}\0{sorted(route.methods)}\0{route.name}\0{route.status_code}\0"
+                f"{route.response_model!r}\0{route.description}\0{route.summary}\0{route.tags}\0"
+                f"{route.include_in_schema}\0{_route_parameters(route)}\n".encode()
+            )
+    for path in sorted(_source_files(app)):
+        digest.update(os.path.relpath(path, APP_DIR).encode())
+        with open(path, "rb") as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+
+def write(app: FastAPI, path: str) -> None:
+    document = {"fingerprint": fingerprint(app), "openapi": app.openapi()}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as cache_file:
+        json.dump(document, cache_file, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load(app: FastAPI, path: str) -> bool:
+    """Serve the cached document instead of generating it on the first docs hit.
+
+    A cache built from different code is ignored, so a stale file only costs
+    the usual lazy generation.
+    """
+    try:
+        with open(path) as cache_file:
+            document = json.load(cache_file)
+    except FileNotFoundError:
+        logger.warning("OpenAPI cache %s not found", path)
+        return False
+    if document.get("fingerprint") != fingerprint(app):
+        logger.warning("OpenAPI cache %s is stale; regenerate it with python -m app.openapi", path)
+        return False
+    app.openapi_schema = document["openapi"]
+    return True
@@ -0,0 +1,35 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core import metrics
+from app.core.slow_query import current_route
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["pool_checked_out_at"] = time.perf_counter()
+    connection_record.info["pool_checked_out_by"] = current_route()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop("pool_checked_out_at", None)
+    if started is None:
+        return
+    route = connection_record.info.pop("pool_checked_out_by", None) or "background"
+    metrics.observe("db.pool.hold_ms", (time.perf_counter() - started) * 1000, route=route)
+
+
+def install(engine: Engine) -> None:
+    """Record how long each checkout holds a pooled connection, per route."""
+    event.listen(engine, "checkout", _on_checkout)
+    event.listen(engine, "checkin", _on_checkin)
+
+
+def pool_status(engine: Engine) -> dict:
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    for name in ("size", "checkedout", "overflow", "checkedin"):
+        if hasattr(pool, name):
+            status[name] = getattr(pool, name)()
+    return status
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.models import ItemShard, Product
+from app.core.shards import DEFAULT_SHARD
+
+
+class ProductRef(NamedTuple):
+    """What the item endpoints need to know about a live product."""
+    id: int
+    company_id: str
+    # Where its items are, and whether they are being moved to another shard
+    shard: str = DEFAULT_SHARD
+    moving: bool = False
+
+
+# product_id -> (expires_at, ProductRef), least recently used first.  Only live
+# products are cached.  Entries are dropped explicitly when a product changes in
+# this process; the TTL bounds how long other workers can serve a stale entry,
+# and reclaim and shard moves wait out the TTL before touching a product's
+# storage.
+_products = OrderedDict()
+_lock = threading.Lock()
+
+
+def _store(product_id: int, ref: ProductRef, now: float) -> None:
+    with _lock:
+        _products[product_id] = (now + settings.PRODUCT_CACHE_TTL_SECONDS, ref)
+        _products.move_to_end(product_id)
+        while len(_products) > settings.PRODUCT_CACHE_MAX_ENTRIES:
+            _products.popitem(last=False)
+
+
+def get_product(db: Session, product_id: int) -> Optional[ProductRef]:
+    """The live product with this id, or None."""
+    now = time.monotonic()
+    with _lock:
+        cached = _products.get(product_id)
+        if cached is not None and cached[0] > now:
+            _products.move_to_end(product_id)
+    if cached is not None and cached[0] > now:
+        metrics.increment("product_cache.hits")
+        return cached[1]
+    metrics.increment("product_cache.misses")
+    row = _query(db).filter(Product.id == product_id).first()
+    if row is None:
+        return None
+    ref = _ref(row)
+    _store(product_id, ref, now)
+    return ref
+
+
+def _query(db: Session):
+    return db.query(
+        Product.id, Product.company_id, ItemShard.shard, ItemShard.status
+    ).outerjoin(ItemShard, ItemShard.product_id == Product.id).filter(Product.deleted_at.is_(None))
+
+
+def _ref(row) -> ProductRef:
+    return ProductRef(row.id, row.company_id, row.shard or DEFAULT_SHARD, row.status == "moving")
+
+
+def preload(db: Session, limit: int) -> list:
+    """Cache the most recently updated live products; return them."""
+    rows = _query(db).order_by(Product.updated_at.desc()).limit(limit).all()
+    now = time.monotonic()
+    refs = [_ref(row) for row in rows]
+    for ref in refs:
+        _store(ref.id, ref, now)
+    return refs
+
+
+def invalidate(product_id: Optional[int] = None) -> None:
+    """Forget one cached product, or all of them."""
+    with _lock:
+        if product_id is None:
+            _products.clear()
+        else:
+            _products.pop(product_id, None)
@@ -0,0 +1,284 @@
+"""Statistical profiler for the running app.
+
+A capture samples the Python stacks of threads serving requests every few
+milliseconds with sys._current_frames(), so nothing is traced and requests
+that are not sampled pay only for a context variable lookup.  Each sample is
+attributed to the route template of the request the thread was working for:
+
+- ProfiledRoute marks each request it admits into a capture (all of them, or
+  a random fraction) and registers the request's asyncio task, so samples
+  of the event loop thread count when that task is the one running.
+- The endpoint and its dependencies are wrapped so that, while a sampled
+  request runs one of them in the threadpool, the worker thread is
+  registered for the request's route.
+
+Stacks are kept aggregated and can be exported as collapsed stacks (for
+flamegraph.pl, inferno and most flamegraph viewers) or as speedscope JSON.
+Captures are per worker process.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+# Deepest stack kept per sample; deeper frames near the root are dropped
+MAX_DEPTH = 128
+MAX_SECONDS = 300
+
+# Route label of the current request while it is being profiled
+_request_route: ContextVar[Optional[str]] = ContextVar("profiled_route", default=None)
+
+# thread ident -> route label, for threadpool threads running a profiled request
+_threads: Dict[int, str] = {}
+# asyncio task -> route label, for profiled requests on the event loop
+_tasks: Dict[asyncio.Task, str] = {}
+# thread ident -> event loop running in it
+_loops: Dict[int, asyncio.AbstractEventLoop] = {}
+
+_capture: Optional["Capture"] = None
+_capture_lock = threading.Lock()
+
+
+class CaptureRunning(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry.rstrip(os.sep) + os.sep) and len(entry) > len(best):
+            best = entry
+    return filename[len(best.rstrip(os.sep)) + 1:] if best else filename
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Capture:
+    """Samples collected by one profiler run, aggregated by route and stack."""
+
+    def __init__(self, interval: float, request_fraction: float, all_threads: bool):
+        self.interval = interval
+        self.request_fraction = request_fraction
+        self.all_threads = all_threads
+        self.started_at = time.time()
+        self.samples = 0
+        self.requests = 0
+        # (route, stack from root to leaf) -> [samples, milliseconds]
+        self.stacks: Dict[tuple, list] = {}
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def admits(self) -> bool:
+        return self.request_fraction >= 1 or random.random() < self.request_fraction
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self.stopping.wait(self.interval):
+            now = time.perf_counter()
+            # Weighted by the time since the last tick, which stretches when
+            # the GIL is busy
+            elapsed_ms = (now - last) * 1000
+            last = now
+            self._sample(own, elapsed_ms)
+
+    def _sample(self, own: int, elapsed_ms: float) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()} if self.all_threads else {}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            route = _threads.get(ident)
+            if route is None and ident in _loops:
+                task = asyncio.current_task(_loops[ident])
+                route = _tasks.get(task) if task is not None else None
+            if route is None:
+                if not self.all_threads:
+                    continue
+                route = f"(thread {names.get(ident, ident)})"
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            key = (route, tuple(reversed(stack)))
+            entry = self.stacks.get(key)
+            if entry is None:
+                self.stacks[key] = [1, elapsed_ms]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed_ms
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """One "route;frame;...;frame count" line per distinct stack."""
+        lines = [
+            ";".join((route,) + stack) + f" {count}"
+            for (route, stack), (count, _) in sorted(self.stacks.items())
+        ]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> dict:
+        """The capture as a speedscope file with one sampled profile per route."""
+        frames: List[dict] = []
+        frame_index: Dict[str, int] = {}
+        profiles: Dict[str, dict] = {}
+        for (route, stack), (_, weight) in sorted(self.stacks.items()):
+            indexes = []
+            for name in stack:
+                index = frame_index.get(name)
+                if index is None:
+                    index = frame_index[name] = len(frames)
+                    frames.append({"name": name})
+                indexes.append(index)
+            profile = profiles.get(route)
+            if profile is None:
+                profile = profiles[route] = {
+                    "type": "sampled",
+                    "name": route,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": 0,
+                    "samples": [],
+                    "weights": [],
+                }
+            profile["samples"].append(indexes)
+            profile["weights"].append(round(weight, 3))
+            profile["endValue"] = round(profile["endValue"] + weight, 3)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"worker {os.getpid()} at {time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(self.started_at))} UTC",
+            "exporter": "app.core.profiler",
+            "shared": {"frames": frames},
+            "profiles": sorted(profiles.values(), key=lambda profile: -profile["endValue"]),
+        }
+
+
+def start(interval: float, request_fraction: float = 1.0, all_threads: bool = False) -> Capture:
+    """Start this worker's capture; raises CaptureRunning if one is in progress."""
+    global _capture
+    with _capture_lock:
+        if _capture is not None:
+            raise CaptureRunning()
+        _capture = Capture(interval, request_fraction, all_threads)
+        _capture.thread.start()
+        return _capture
+
+
+def stop(capture: Capture) -> None:
+    global _capture
+    capture.stopping.set()
+    capture.thread.join()
+    with _capture_lock:
+        if _capture is capture:
+            _capture = None
+
+
+def _attributed_function(call):
+    # Plain function wrapper for endpoints, whose async-ness FastAPI checks
+    # with asyncio.iscoroutinefunction
+    if asyncio.iscoroutinefunction(call):
+        return call
+
+    @functools.wraps(call)
+    def attributed(*args, **kwargs):
+        with _thread_attributed():
+            return call(*args, **kwargs)
+    return attributed
+
+
+class _AttributedDependency:
+    """Wraps a sync dependency function; hashes and compares like the function
+    itself so app.dependency_overrides still finds it."""
+
+    def __init__(self, call):
+        self.call = call
+        functools.update_wrapper(self, call)
+
+    def __call__(self, *args, **kwargs):
+        with _thread_attributed():
+            return self.call(*args, **kwargs)
+
+    def __hash__(self):
+        return hash(self.call)
+
+    def __eq__(self, other):
+        return other is self or other == self.call
+
+
+class _thread_attributed:
+    __slots__ = ("ident", "previous")
+
+    def __enter__(self):
+        route = _request_route.get()
+        self.ident = None
+        if route is not None:
+            self.ident = threading.get_ident()
+            self.previous = _threads.get(self.ident)
+            _threads[self.ident] = route
+
+    def __exit__(self, *exc_info):
+        if self.ident is not None:
+            if self.previous is None:
+                _threads.pop(self.ident, None)
+            else:
+                _threads[self.ident] = self.previous
+
+
+def _instrument(dependant, seen: set) -> None:
+    for sub_dependant in dependant.dependencies:
+        if id(sub_dependant) in seen:
+            continue
+        seen.add(id(sub_dependant))
+        call = sub_dependant.call
+        # Generators (get_db) are entered by FastAPI itself, and async
+        # dependencies already run on the request's task
+        if inspect.isfunction(call) and not (
+            inspect.isgeneratorfunction(call) or asyncio.iscoroutinefunction(call)
+        ):
+            sub_dependant.call = _AttributedDependency(call)
+        _instrument(sub_dependant, seen)
+
+
+class ProfiledRoute(APIRoute):
+    """Route whose requests can be attributed in a profiler capture."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependant.call = _attributed_function(self.dependant.call)
+        _instrument(self.dependant, set())
+
+    @property
+    def profile_label(self) -> str:
+        return f"{','.join(sorted(self.methods))} {self.path_format}"
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request):
+            capture = _capture
+            if capture is None or not capture.admits():
+                return await handler(request)
+            capture.requests += 1
+            label = self.profile_label
+            task = asyncio.current_task()
+            _loops.setdefault(threading.get_ident(), asyncio.get_running_loop())
+            _tasks[task] = label
+            token = _request_route.set(label)
+            try:
+                return await handler(request)
+            finally:
+                _request_route.reset(token)
+                _tasks.pop(task, None)
+
+        return route_handler
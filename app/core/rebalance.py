@@ -0,0 +1,135 @@
+"""Move a product's items from one shard to another.
+
+A move goes through the shard map in steps, waiting ITEM_SHARD_SETTLE_SECONDS
+after each so that every worker's product cache has picked it up:
+
+1. The product is marked moving.  Item writes get 503 from then on; reads
+   keep using the source shard.
+2. Items are copied to the target shard in batches and the counts compared.
+3. The map points at the target shard, with the source kept as
+   previous_shard; workers switch over as their cache entries expire.
+4. The source table is dropped and previous_shard cleared.
+
+Moving the same product again resumes an interrupted move: the copy restarts
+from scratch, and a leftover source table is dropped first.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import func, select
+
+from app.core import archive, item_tables, metrics, shards
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.models import ItemShard, Product
+
+
+def _wait_settled(placement: ItemShard, settle_seconds: float) -> None:
+    # Measured from the last map change, so a resumed move does not wait twice
+    remaining = (placement.updated_at + timedelta(seconds=settle_seconds) - datetime.utcnow()).total_seconds()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def copy_items(product_id: int, source: str, target: str, on_batch: Optional[Callable[[int], None]] = None) -> int:
+    """Copy a product's item table between shards in id order; return the row count."""
+    source_table = item_tables.get_items_table(product_id, source)
+    target_table = item_tables.get_items_table(product_id, target)
+    source_engine = shards.get_shard_engine(source)
+    target_engine = shards.get_shard_engine(target)
+
+    with target_engine.begin() as connection:
+        # Left over from an interrupted copy
+        connection.execute(target_table.delete())
+    copied = 0
+    last_id = None
+    while True:
+        query = select(source_table).order_by(source_table.c.id).limit(settings.ITEM_SHARD_MOVE_BATCH_ROWS)
+        if last_id is not None:
+            query = query.where(source_table.c.id > last_id)
+        with source_engine.connect() as connection:
+            rows = [dict(row._mapping) for row in connection.execute(query)]
+        if not rows:
+            break
+        with target_engine.begin() as connection:
+            connection.execute(target_table.insert(), rows)
+        last_id = rows[-1]["id"]
+        copied += len(rows)
+        metrics.increment("shards.rows_moved", len(rows))
+        if on_batch is not None:
+            on_batch(copied)
+
+    with source_engine.connect() as connection:
+        expected = connection.execute(select(func.count()).select_from(source_table)).scalar()
+    with target_engine.connect() as connection:
+        actual = connection.execute(select(func.count()).select_from(target_table)).scalar()
+    if actual != expected:
+        raise RuntimeError(
+            f"Copied {actual} of {expected} items of product {product_id} to shard {target!r}"
+        )
+    return copied
+
+
+def _drop_previous(db, placement: ItemShard, settle_seconds: float) -> None:
+    # Workers may read the old table until their cache entry expires
+    _wait_settled(placement, settle_seconds)
+    previous = placement.previous_shard
+    with shards.get_shard_engine(previous).begin() as connection:
+        item_tables.drop_items_table(connection, placement.product_id, previous)
+    placement.previous_shard = None
+    db.commit()
+
+
+def move_product(
+    product_id: int,
+    target: str,
+    settle_seconds: Optional[float] = None,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Move a product's items to the target shard; return how many were copied.
+
+    settle_seconds must exceed PRODUCT_CACHE_TTL_SECONDS: a worker that still
+    has the old placement cached would otherwise write to the source shard
+    after the copy, and those items would be lost.
+    """
+    settle = settings.ITEM_SHARD_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+    if settle <= settings.PRODUCT_CACHE_TTL_SECONDS:
+        raise ValueError(
+            f"Settle time {settle}s must exceed PRODUCT_CACHE_TTL_SECONDS ({settings.PRODUCT_CACHE_TTL_SECONDS}s)"
+        )
+    shards.get_shard_engine(target)
+    # Archiving deletes rows from the live table, so it must not run meanwhile
+    with archive.product_lock(product_id):
+        db = SessionLocal()
+        try:
+            if not db.query(Product.id).filter(Product.id == product_id, Product.deleted_at.is_(None)).first():
+                raise ValueError(f"Product {product_id} not found")
+            placement = db.get(ItemShard, product_id)
+            if placement is None:
+                placement = ItemShard(product_id=product_id, shard=shards.DEFAULT_SHARD, status="active")
+                db.add(placement)
+                db.commit()
+            if placement.previous_shard and placement.previous_shard != target:
+                _drop_previous(db, placement, settle)
+            if placement.shard == target and placement.status == "active":
+                return 0
+
+            if placement.status != "moving" or placement.moving_to != target:
+                placement.status = "moving"
+                placement.moving_to = target
+                db.commit()
+            _wait_settled(placement, settle)
+
+            copied = copy_items(product_id, placement.shard, target, on_batch)
+            placement.previous_shard = placement.shard
+            placement.shard = target
+            placement.status = "active"
+            placement.moving_to = None
+            db.commit()
+            metrics.increment("shards.products_moved")
+
+            _drop_previous(db, placement, settle)
+            return copied
+        finally:
+            db.close()
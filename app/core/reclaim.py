@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, inspect, or_
+from sqlalchemy.orm import Session
+
+from app.core import archive, item_tables, metrics, shards, tenancy
+from app.core.config import settings
+from app.core.database import SessionLocal, get_engine
+from app.core.models import Company, ItemShard, Product, ReclaimJob, UserCompany
+
+logger = logging.getLogger("app.reclaim")
+
+
+def enqueue(db: Session, kind: str, target_id, total: int = 0) -> ReclaimJob:
+    """Queue reclaim of a tombstoned product or company.
+
+    The caller commits together with the tombstone, then calls wake().
+    """
+    job = ReclaimJob(kind=kind, target_id=str(target_id), status="pending", total=total, done=0)
+    db.add(job)
+    return job
+
+
+def _claimable():
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.RECLAIM_STALE_SECONDS)
+    # Other workers may serve a deleted product from their product cache
+    # until its entry expires, so its storage must outlive that
+    settled = now - timedelta(seconds=settings.PRODUCT_CACHE_TTL_SECONDS)
+    # A running job nobody has touched for a while lost its worker
+    return or_(
+        and_(ReclaimJob.status == "pending", ReclaimJob.created_at < settled),
+        and_(ReclaimJob.status == "running", ReclaimJob.updated_at < stale),
+    )
+
+
+def claim_next(db: Session) -> Optional[ReclaimJob]:
+    """Claim the oldest runnable job; safe with several workers polling."""
+    candidates = db.query(ReclaimJob.id).filter(_claimable()).order_by(ReclaimJob.id).limit(10).all()
+    for (job_id,) in candidates:
+        claimed = db.query(ReclaimJob).filter(ReclaimJob.id == job_id, _claimable()).update(
+            {ReclaimJob.status: "running", ReclaimJob.updated_at: datetime.utcnow()},
+            synchronize_session=False,
+        )
+        db.commit()
+        if claimed:
+            return db.get(ReclaimJob, job_id)
+    return None
+
+
+def _drop_products(db: Session, product_ids: list) -> None:
+    placed = {
+        row.product_id: row
+        for row in db.query(ItemShard).filter(ItemShard.product_id.in_(product_ids))
+    }
+    connection = db.connection()
+    for product_id in product_ids:
+        row = placed.get(product_id)
+        in_shards = {shards.DEFAULT_SHARD} if row is None else {row.shard, row.moving_to, row.previous_shard}
+        # Waits for an archive run or shard move of the product to finish
+        with archive.product_lock(product_id):
+            for shard in in_shards - {None}:
+                if shard == shards.DEFAULT_SHARD:
+                    item_tables.drop_items_table(connection, product_id)
+                else:
+                    # Dropping again is harmless if the job is retried
+                    with shards.get_shard_engine(shard).begin() as shard_connection:
+                        item_tables.drop_items_table(shard_connection, product_id, shard)
+            archive.drop_archive(product_id)
+    db.query(ItemShard).filter(ItemShard.product_id.in_(product_ids)).delete(synchronize_session=False)
+    db.query(Product).filter(
+        Product.id.in_(product_ids), Product.deleted_at.isnot(None)
+    ).delete(synchronize_session=False)
+
+
+class ReclaimWorker(threading.Thread):
+    """Reclaims storage of deleted products and companies in the background.
+
+    Deletes only tombstone rows, so the request that deleted them returns
+    immediately.  Work is done in chunks of RECLAIM_BATCH_SIZE products with
+    a pause between chunks, and each chunk is committed with the job's
+    progress, so an interrupted job resumes where it stopped.
+    """
+
+    def __init__(self):
+        super().__init__(name="reclaim-worker", daemon=True)
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+        self.ready = False
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            try:
+                worked = self.run_once()
+            except Exception:
+                logger.exception("Reclaim worker failed")
+                worked = False
+            if not worked:
+                self.wakeup.wait(settings.RECLAIM_POLL_SECONDS)
+
+    def run_once(self) -> bool:
+        if not self.ready:
+            # Fresh databases get their tables on first login
+            self.ready = inspect(get_engine()).has_table(ReclaimJob.__tablename__)
+            if not self.ready:
+                return False
+        db = SessionLocal()
+        try:
+            job = claim_next(db)
+            if job is None:
+                return False
+            self.process(db, job)
+            return True
+        finally:
+            db.close()
+
+    def process(self, db: Session, job: ReclaimJob) -> None:
+        try:
+            if job.kind == "product":
+                _drop_products(db, [int(job.target_id)])
+                job.done = job.total
+                finished = True
+            elif job.kind == "company":
+                finished = self._reclaim_company(db, job)
+            else:
+                raise ValueError(f"Unknown reclaim job kind {job.kind!r}")
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Reclaim job %s failed", job.id)
+            job.status = "failed"
+            job.error = str(exc)[:500]
+            db.commit()
+            metrics.increment("reclaim.jobs", status="failed", kind=job.kind)
+            return
+        # Interrupted jobs go back to pending so the next start resumes them
+        job.status = "done" if finished else "pending"
+        db.commit()
+        if finished:
+            metrics.increment("reclaim.jobs", status="done", kind=job.kind)
+
+    def _reclaim_company(self, db: Session, job: ReclaimJob) -> bool:
+        company_id = job.target_id
+        while True:
+            if self.stopping.is_set():
+                return False
+            started = time.perf_counter()
+            product_ids = [
+                product_id
+                for (product_id,) in db.query(Product.id)
+                .filter(Product.company_id == company_id, Product.deleted_at.isnot(None))
+                .order_by(Product.id)
+                .limit(settings.RECLAIM_BATCH_SIZE)
+                .all()
+            ]
+            if not product_ids:
+                break
+            _drop_products(db, product_ids)
+            job.done += len(product_ids)
+            job.updated_at = datetime.utcnow()
+            db.commit()
+            metrics.increment("reclaim.products", len(product_ids))
+            metrics.observe("reclaim.chunk_ms", (time.perf_counter() - started) * 1000)
+            self.stopping.wait(settings.RECLAIM_PAUSE_SECONDS)
+
+        user_ids = [
+            user_id
+            for (user_id,) in db.query(UserCompany.user_id).filter(UserCompany.company_id == company_id)
+        ]
+        db.query(UserCompany).filter(UserCompany.company_id == company_id).delete(synchronize_session=False)
+        db.query(Company).filter(
+            Company.id == company_id, Company.deleted_at.isnot(None)
+        ).delete(synchronize_session=False)
+        db.flush()
+        for user_id in user_ids:
+            tenancy.invalidate(user_id)
+        return True
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.wakeup.set()
+
+
+_worker: Optional[ReclaimWorker] = None
+
+
+def start_worker() -> None:
+    """Start this process's reclaim worker; it also resumes unfinished jobs."""
+    global _worker
+    if settings.RECLAIM_ENABLED and _worker is None:
+        _worker = ReclaimWorker()
+        _worker.start()
+
+
+def stop_worker(timeout: float = 10) -> None:
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker.join(timeout)
+        _worker = None
+
+
+def wake() -> None:
+    """Have the worker look for jobs now instead of at its next poll."""
+    if _worker is not None:
+        _worker.wakeup.set()
@@ -1,11 +1,17 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, EmailStr
+from typing import Optional, List, Union
+from pydantic import BaseModel, EmailStr, Field
+
+from app.core.config import settings
 
 # Token schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenPayload(BaseModel):
     sub: Optional[int] = None
@@ -60,6 +66,22 @@ class CompanyInDBBase(CompanyBase):
 class Company(CompanyInDBBase):
     pass
 
+class CompanyLookup(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=settings.LOOKUP_MAX_KEYS)
+    codes: Optional[List[str]] = Field(None, max_length=settings.LOOKUP_MAX_KEYS)
+
+class CompanyLookupResult(BaseModel):
+    items: List[Company]
+    missing: List[str]
+
+# Image schemas
+class ImageUpload(BaseModel):
+    id: str
+    url: str
+    thumbnail_url: str
+    content_type: str
+    size: int
+
 # Product schemas
 class ProductBase(BaseModel):
     code: str
@@ -86,6 +108,14 @@ class ProductInDBBase(ProductBase):
 class Product(ProductInDBBase):
     pass
 
+class ProductLookup(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=settings.LOOKUP_MAX_KEYS)
+    codes: Optional[List[str]] = Field(None, max_length=settings.LOOKUP_MAX_KEYS)
+
+class ProductLookupResult(BaseModel):
+    items: List[Product]
+    missing: List[Union[int, str]]
+
 # Item schemas
 class ItemBase(BaseModel):
     key: str
@@ -107,7 +137,30 @@ class ItemInDBBase(ItemBase):
 class Item(ItemInDBBase):
     pass
 
+class ItemLookup(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=settings.LOOKUP_MAX_KEYS)
+    keys: Optional[List[str]] = Field(None, max_length=settings.LOOKUP_MAX_KEYS)
+
+class ItemLookupResult(BaseModel):
+    items: List[Item]
+    missing: List[str]
+
 # Batch operations
 class BatchItemCreate(BaseModel):
     quantity: int
-    box_key: str 
\ No newline at end of file
+    box_key: str
+
+# Background jobs
+class ReclaimJob(BaseModel):
+    id: int
+    kind: str
+    target_id: str
+    status: str
+    total: int
+    done: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
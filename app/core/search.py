@@ -0,0 +1,131 @@
+import re
+import weakref
+from typing import Optional
+
+from sqlalchemy import Integer, column, func, or_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session
+
+from app.core.models import Product
+
+# SQLite stand-in for the Postgres trigram/full-text indexes: an external
+# content FTS5 table over products kept in sync by triggers.
+SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, code, description, content='products', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, code, description)
+        VALUES (new.id, new.name, new.code, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, code, description)
+        VALUES ('delete', old.id, old.name, old.code, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, code, description)
+        VALUES ('delete', old.id, old.name, old.code, old.description);
+        INSERT INTO products_fts(rowid, name, code, description)
+        VALUES (new.id, new.name, new.code, new.description);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_OBJECTS = ("products_fts", "products_fts_ai", "products_fts_ad", "products_fts_au")
+
+# Engines whose database is known to have the FTS table and its triggers
+_sqlite_fts_ready: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def ensure_sqlite_fts(db: Session) -> None:
+    """Create the FTS table on SQLite databases that were not migrated with Alembic."""
+    engine = db.get_bind()
+    if engine in _sqlite_fts_ready:
+        return
+    present = db.execute(
+        text("SELECT count(*) FROM sqlite_master WHERE name IN (:table, :ai, :ad, :au)"),
+        dict(zip(("table", "ai", "ad", "au"), SQLITE_FTS_OBJECTS)),
+    ).scalar()
+    if present < len(SQLITE_FTS_OBJECTS):
+        for statement in SQLITE_FTS_DDL:
+            db.execute(text(statement))
+        db.commit()
+    _sqlite_fts_ready.add(engine)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts5_query(q: str) -> str:
+    """Turn free text into an FTS5 query of quoted prefix terms."""
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_products(
+    db: Session,
+    q: Optional[str] = None,
+    company_id: Optional[str] = None,
+    company_ids: Optional[frozenset] = None,
+) -> Query:
+    """Products matching a name/code prefix, a fuzzy name match or description words.
+
+    On Postgres the predicates are served by the pg_trgm and full-text GIN
+    indexes from the product search migration; on SQLite by the products_fts
+    table.  Results are ordered by relevance when a query is given.
+    company_ids restricts results to a tenant scope (None means unrestricted).
+    """
+    query = db.query(Product).filter(Product.deleted_at.is_(None))
+    if company_id is not None:
+        query = query.filter(Product.company_id == company_id)
+    if company_ids is not None:
+        query = query.filter(Product.company_id.in_(company_ids))
+    q = (q or "").strip()
+    if not q:
+        return query.order_by(Product.id)
+
+    prefix = _escape_like(q) + "%"
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        document = func.to_tsvector("simple", func.coalesce(Product.description, ""))
+        matches_description = document.op("@@")(func.plainto_tsquery("simple", q))
+        query = query.filter(
+            or_(
+                Product.code.ilike(prefix, escape="\\"),
+                Product.name.ilike(prefix, escape="\\"),
+                Product.name.op("%")(q),
+                matches_description,
+            )
+        )
+        return query.order_by(
+            (Product.code == q).desc(),
+            func.similarity(Product.name, q).desc(),
+            Product.id,
+        )
+
+    if dialect == "sqlite":
+        ensure_sqlite_fts(db)
+        fts_query = _fts5_query(q)
+        conditions = [
+            Product.code.like(prefix, escape="\\"),
+            Product.name.like(prefix, escape="\\"),
+        ]
+        if fts_query:
+            conditions.append(
+                Product.id.in_(
+                    text("SELECT rowid FROM products_fts WHERE products_fts MATCH :fts_query")
+                    .bindparams(fts_query=fts_query)
+                    .columns(column("rowid", Integer))
+                )
+            )
+        return query.filter(or_(*conditions)).order_by((Product.code == q).desc(), Product.id)
+
+    contains = "%" + _escape_like(q) + "%"
+    return query.filter(
+        or_(
+            Product.code.like(prefix, escape="\\"),
+            Product.name.ilike(contains, escape="\\"),
+            Product.description.ilike(contains, escape="\\"),
+        )
+    ).order_by((Product.code == q).desc(), Product.id)
@@ -1,6 +1,8 @@
+import hashlib
+import secrets
 from datetime import datetime, timedelta
-from typing import Any, Union
-from jose import jwt
+from typing import Any, Optional, Tuple, Union
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
@@ -21,8 +23,26 @@ def create_access_token(
     )
     return encoded_jwt
 
+def token_subject(token: str) -> Optional[str]:
+    """The subject of a valid access token, or None."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    return str(subject) if subject is not None else None
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password) 
\ No newline at end of file
+    return pwd_context.hash(password) 
+
+def create_refresh_token() -> Tuple[str, bytes]:
+    """Return a new opaque refresh token and the digest to store for it."""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+def hash_refresh_token(token: str) -> bytes:
+    # Refresh tokens are high-entropy random values, so a fast hash is enough
+    return hashlib.sha256(token.encode()).digest()
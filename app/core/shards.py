@@ -0,0 +1,112 @@
+"""Placement of item tables across several databases.
+
+The main database is the "default" shard; ITEM_SHARD_URLS names the others.
+The item_shards table maps each product to the shard holding its
+items_{product_id} table; products without a row (everything created before
+sharding was configured) live in the default shard.  Products, companies and
+users always stay in the main database.
+"""
+import threading
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, build_engine, get_engine
+from app.core.models import ItemShard, Product
+
+DEFAULT_SHARD = "default"
+
+# Sent with 503 while a product's items are being moved
+MOVE_RETRY_AFTER_SECONDS = 5
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def shard_names() -> List[str]:
+    return [DEFAULT_SHARD, *settings.ITEM_SHARD_URLS]
+
+
+def get_shard_engine(name: str) -> Engine:
+    """Engine of a shard, created on first use like the main one."""
+    if name == DEFAULT_SHARD:
+        return get_engine()
+    engine = _engines.get(name)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(name)
+            if engine is None:
+                if name not in settings.ITEM_SHARD_URLS:
+                    raise ValueError(f"Unknown item shard {name!r}; configure it in ITEM_SHARD_URLS")
+                engine = build_engine(settings.ITEM_SHARD_URLS[name])
+                _engines[name] = engine
+    return engine
+
+
+def dispose_engines() -> None:
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def open_engines() -> Dict[str, Engine]:
+    """Engines of the extra shards opened so far in this process, by name."""
+    return dict(_engines)
+
+
+def assign(db: Session, product_id: int) -> str:
+    """Place a new product's items; the caller commits with the product."""
+    if not settings.ITEM_SHARD_URLS:
+        return DEFAULT_SHARD
+    names = settings.ITEM_SHARD_NEW_PRODUCTS or shard_names()
+    # Round robin by id: no query, and stable once recorded
+    shard = names[product_id % len(names)]
+    get_shard_engine(shard)
+    db.add(ItemShard(product_id=product_id, shard=shard, status="active"))
+    return shard
+
+
+def placement(db: Session, product_id: int) -> Tuple[str, bool]:
+    """(shard, moving) for a product, uncached; for background work."""
+    row = db.get(ItemShard, product_id)
+    if row is None:
+        return DEFAULT_SHARD, False
+    return row.shard, row.status == "moving"
+
+
+def product_shard(product_id: int) -> str:
+    db = SessionLocal()
+    try:
+        return placement(db, product_id)[0]
+    finally:
+        db.close()
+
+
+def check_writable(product) -> None:
+    """Reject item writes while the product's items are being moved."""
+    if product.moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Items of this product are being moved, retry later",
+            headers={"Retry-After": str(MOVE_RETRY_AFTER_SECONDS)},
+        )
+
+
+def shard_counts(db: Session) -> Dict[str, int]:
+    """Live products whose items are in each shard."""
+    shard = func.coalesce(ItemShard.shard, DEFAULT_SHARD)
+    counts = {name: 0 for name in shard_names()}
+    rows = (
+        db.query(shard, func.count(Product.id))
+        .outerjoin(ItemShard, ItemShard.product_id == Product.id)
+        .filter(Product.deleted_at.is_(None))
+        .group_by(shard)
+    )
+    for name, count in rows:
+        counts[name] = count
+    return counts
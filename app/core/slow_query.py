@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.slow_query")
+
+# The ASGI scope of the request currently being served, so the listener can
+# name the route that issued a statement.  FastAPI stores the matched route in
+# the scope during routing, which happens before any query runs.
+_current_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_scope", default=None)
+
+_recent = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+_recent_lock = threading.Lock()
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+# Held while an EXPLAIN is queued or running; slow statements arriving
+# meanwhile are logged without a plan instead of piling up behind it
+_explain_slot = threading.Semaphore(1)
+# statement text -> when it was last explained
+_explained: Dict[str, float] = {}
+_explained_lock = threading.Lock()
+
+_SAFE_PARAM_TYPES = (int, float, bool, type(None))
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Replace bind values with type placeholders, keeping numbers for context."""
+    if isinstance(parameters, dict):
+        return {key: redact_parameters(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(value) for value in parameters]
+    if isinstance(parameters, _SAFE_PARAM_TYPES):
+        return parameters
+    if isinstance(parameters, (str, bytes)):
+        return f"<{type(parameters).__name__}:{len(parameters)}>"
+    return f"<{type(parameters).__name__}>"
+
+
+def _summarize_parameters(parameters: Any, executemany: bool) -> Any:
+    """Redact bind values; executemany batches keep only the first row and a count."""
+    if executemany and parameters:
+        return {"rows": len(parameters), "first": redact_parameters(parameters[0])}
+    return redact_parameters(parameters)
+
+
+def current_route() -> Optional[str]:
+    """Method and route template of the request being served, if any."""
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    if route is not None:
+        return f"{scope.get('method')} {route.path}"
+    return f"{scope.get('method')} {scope.get('path')}"
+
+
+def _explain(engine: Engine, entry: dict, statement: str, parameters: Any) -> None:
+    """Capture the query plan for a slow statement without running it again.
+
+    Runs on a raw DBAPI cursor so the EXPLAIN itself bypasses the listeners.
+    """
+    if engine.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE off) "
+    elif engine.dialect.name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return
+    try:
+        with engine.connect() as connection:
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                entry["plan"] = [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    except Exception as exc:
+        entry["plan_error"] = str(exc)
+    finally:
+        _explain_slot.release()
+
+
+def _claim_explain(statement: str) -> bool:
+    """Whether to explain this statement now: nothing else is being explained
+    and the same text was not explained within the interval."""
+    now = time.monotonic()
+    interval = settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+    with _explained_lock:
+        last = _explained.get(statement)
+        if last is not None and now - last < interval:
+            return False
+        if not _explain_slot.acquire(blocking=False):
+            return False
+        if len(_explained) >= settings.SLOW_QUERY_LOG_SIZE:
+            for text, at in list(_explained.items()):
+                if now - at >= interval:
+                    del _explained[text]
+            if len(_explained) >= settings.SLOW_QUERY_LOG_SIZE:
+                del _explained[next(iter(_explained))]
+        _explained.pop(statement, None)
+        _explained[statement] = now
+        return True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["slow_query_start"].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    entry = {
+        "recorded_at": datetime.utcnow().isoformat(),
+        "duration_ms": round(elapsed_ms, 3),
+        "route": current_route(),
+        "statement": statement,
+        "parameters": _summarize_parameters(parameters, executemany),
+        "executemany": executemany,
+        "plan": None,
+    }
+    with _recent_lock:
+        _recent.append(entry)
+    logger.warning(
+        "slow query (%.1f ms) from %s: %s params=%s",
+        elapsed_ms, entry["route"], statement, entry["parameters"],
+    )
+
+    if (
+        settings.SLOW_QUERY_EXPLAIN
+        and not executemany
+        and statement.lstrip().upper().startswith(("SELECT", "WITH"))
+        and _claim_explain(statement)
+    ):
+        try:
+            _explain_executor.submit(_explain, conn.engine, entry, statement, parameters)
+        except RuntimeError:
+            # Executor shut down at interpreter exit
+            _explain_slot.release()
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_start"):
+        connection.info["slow_query_start"].pop()
+
+
+def install(engine: Engine) -> None:
+    """Attach the slow-query listeners to an engine."""
+    if settings.SLOW_QUERY_THRESHOLD_MS <= 0:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def recent_slow_queries() -> list:
+    """Return the ring of recent slow queries, newest first."""
+    with _recent_lock:
+        return list(reversed(_recent))
+
+
+class SlowQueryRouteMiddleware:
+    """Remember the ASGI scope of each request for slow-query attribution."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
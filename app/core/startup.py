@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("app.startup")
+
+# (phase, milliseconds) in the order they completed
+_phases = []
+# Set once warm-up has finished; the readiness probe waits for it
+ready = threading.Event()
+
+
+def record(phase: str, seconds: float) -> None:
+    _phases.append((phase, round(seconds * 1000, 1)))
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def report() -> dict:
+    """Startup phases of this worker with their durations."""
+    return {
+        "ready": ready.is_set(),
+        "phases": [{"phase": name, "ms": ms} for name, ms in _phases],
+    }
+
+
+def log_report() -> None:
+    logger.info(
+        "Startup profile: %s",
+        ", ".join(f"{name} {ms:.1f}ms" for name, ms in _phases),
+    )
+
+
+def warm_up(stopping: threading.Event) -> None:
+    """Open pooled connections and load hot products before reporting ready.
+
+    Retries until the database is reachable or the worker shuts down.
+    """
+    from sqlalchemy import inspect
+
+    from app.core import item_tables, product_cache
+    from app.core.config import settings
+    from app.core.database import SessionLocal, get_engine, prewarm_pool
+    from app.core.models import Product
+
+    while not stopping.is_set():
+        started = time.perf_counter()
+        try:
+            if settings.DB_POOL_PREWARM:
+                with phase("pool prewarm"):
+                    prewarm_pool(settings.DB_POOL_PREWARM)
+            # Fresh databases get their tables on first login
+            if settings.WARMUP_PRODUCTS and inspect(get_engine()).has_table(Product.__tablename__):
+                with phase("hot products"):
+                    db = SessionLocal()
+                    try:
+                        products = product_cache.preload(db, settings.WARMUP_PRODUCTS)
+                    finally:
+                        db.close()
+                    # Resolving each item table once takes a catalog lookup
+                    for product in products:
+                        item_tables.get_items_table(product.id, product.shard)
+        except Exception:
+            logger.exception("Warm-up failed, retrying")
+            stopping.wait(5)
+            continue
+        record("warm-up", time.perf_counter() - started)
+        ready.set()
+        log_report()
+        return
+
+
+_warm_up_stopping = threading.Event()
+
+
+def start_warm_up() -> None:
+    threading.Thread(target=warm_up, args=(_warm_up_stopping,), name="warm-up", daemon=True).start()
+
+
+def stop_warm_up() -> None:
+    _warm_up_stopping.set()
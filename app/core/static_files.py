@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+
+try:
+    import brotli
+except ImportError:  # brotli variants are optional
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Only worth compressing text-like content; images and archives are already dense
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+
+class StaticAsset:
+    def __init__(self, name: str, body: bytes, media_type: str):
+        self.name = name
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.digest[:16]}"'
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f"{stem}.{self.digest[:8]}{ext}"
+        # encoding -> body; "identity" is always present
+        self.variants = {"identity": body}
+
+    def add_variant(self, encoding: str, body: bytes) -> None:
+        if len(body) < len(self.variants["identity"]):
+            self.variants[encoding] = body
+
+
+class StaticManifest:
+    """All files under the static directory, hashed and precompressed once."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.assets = {}
+        self.by_hashed_name = {}
+
+    def load(self) -> None:
+        assets = {}
+        paths = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith((".gz", ".br")):
+                    continue
+                full_path = os.path.join(root, filename)
+                paths.append((os.path.relpath(full_path, self.directory).replace(os.sep, "/"), full_path))
+
+        # Hash plain assets first so HTML pages can reference their hashed URLs
+        paths.sort(key=lambda item: item[0].endswith(".html"))
+        for name, full_path in paths:
+            with open(full_path, "rb") as fh:
+                body = fh.read()
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if name.endswith(".html"):
+                body = self._rewrite_asset_urls(body, assets)
+            asset = StaticAsset(name, body, media_type)
+            self._add_compressed_variants(asset, full_path)
+            assets[name] = asset
+
+        self.assets = assets
+        self.by_hashed_name = {asset.hashed_name: asset for asset in assets.values()}
+
+    def _rewrite_asset_urls(self, body: bytes, assets: dict) -> bytes:
+        def replace(match):
+            asset = assets.get(match.group(2).decode())
+            if asset is None:
+                return match.group(0)
+            return match.group(1) + asset.hashed_name.encode()
+
+        return re.sub(rb'(["\']/static/)([^"\'?#]+)', replace, body)
+
+    def _add_compressed_variants(self, asset: StaticAsset, full_path: str) -> None:
+        if not asset.media_type.startswith(COMPRESSIBLE_TYPES):
+            return
+        body = asset.variants["identity"]
+        # Prefer build-time precompressed siblings when the source is unmodified
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            sibling = full_path + suffix
+            if os.path.exists(sibling) and os.path.getmtime(sibling) >= os.path.getmtime(full_path):
+                with open(sibling, "rb") as fh:
+                    asset.add_variant(encoding, fh.read())
+        if "gzip" not in asset.variants:
+            asset.add_variant("gzip", gzip.compress(body, compresslevel=9, mtime=0))
+        if "br" not in asset.variants and brotli is not None:
+            asset.add_variant("br", brotli.compress(body, quality=11))
+
+    def url_for(self, name: str) -> str:
+        """Content-hashed URL for a static file, safe to cache forever."""
+        asset = self.assets.get(name)
+        return f"/static/{asset.hashed_name if asset else name}"
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"').split("-")[0] == base:
+            return True
+    return False
+
+
+class StaticAssets:
+    """ASGI app serving the manifest with ETags, 304s and precompressed bodies."""
+
+    def __init__(self, manifest: StaticManifest):
+        self.manifest = manifest
+
+    def lookup(self, path: str) -> tuple:
+        """Return (asset, immutable) for a path relative to the static root."""
+        if not self.manifest.assets:
+            self.manifest.load()
+        asset = self.manifest.by_hashed_name.get(path)
+        if asset is not None:
+            return asset, True
+        return self.manifest.assets.get(path), False
+
+    def response(self, path: str, headers: Headers, method: str = "GET") -> Response:
+        asset, immutable = self.lookup(path)
+        if asset is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = next(
+            (coding for coding in ("br", "gzip") if coding in accepted and coding in asset.variants),
+            "identity",
+        )
+        etag = asset.etag if encoding == "identity" else f'{asset.etag[:-1]}-{encoding}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, asset.etag):
+            return Response(status_code=304, headers=response_headers)
+
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        body = asset.variants[encoding]
+        if method == "HEAD":
+            response_headers["Content-Length"] = str(len(body))
+            body = b""
+        return Response(body, media_type=asset.media_type, headers=response_headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        else:
+            path = scope["path"][len(scope.get("root_path", "")):].lstrip("/")
+            response = self.response(path, Headers(scope=scope), scope["method"])
+        await response(scope, receive, send)
@@ -0,0 +1,54 @@
+import threading
+import time
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.models import User, UserCompany
+
+# user_id -> (expires_at, frozenset of company ids).  Entries are dropped
+# explicitly when memberships change in this process; the TTL bounds how long
+# other workers can serve a stale set.
+_memberships = {}
+_lock = threading.Lock()
+
+
+def load_company_ids(db: Session, user_id: int) -> frozenset:
+    rows = db.query(UserCompany.company_id).filter(UserCompany.user_id == user_id).all()
+    return frozenset(company_id for (company_id,) in rows)
+
+
+def get_company_ids(db: Session, user: User) -> Optional[frozenset]:
+    """Companies the user may see, or None when the user is not restricted."""
+    if user.role == "admin":
+        return None
+    now = time.monotonic()
+    with _lock:
+        cached = _memberships.get(user.id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    company_ids = load_company_ids(db, user.id)
+    with _lock:
+        _memberships[user.id] = (now + settings.MEMBERSHIP_CACHE_TTL_SECONDS, company_ids)
+    return company_ids
+
+
+def invalidate(user_id: Optional[int] = None) -> None:
+    """Forget cached memberships for one user, or for everyone."""
+    with _lock:
+        if user_id is None:
+            _memberships.clear()
+        else:
+            _memberships.pop(user_id, None)
+
+
+def in_scope(scope: Optional[frozenset], company_id: str) -> bool:
+    return scope is None or company_id in scope
+
+
+def check_company_access(scope: Optional[frozenset], company_id: str, detail: str = "Company not found") -> None:
+    """Treat companies outside the caller's scope as if they did not exist."""
+    if not in_scope(scope, company_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
@@ -1,17 +1,59 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from app.core.config import settings
+from fastapi.responses import JSONResponse
+from app.core import events, images, openapi_cache, reclaim, shards, startup
+from app.core.admission import AdmissionMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.config import settings, settings_load_seconds
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.database import get_engine
+from app.core.slow_query import SlowQueryRouteMiddleware
+from app.core.static_files import StaticAssets, StaticManifest
 import os
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.record("settings", settings_load_seconds)
+    startup.record("import app.main", _import_seconds)
+    with startup.phase("static manifest"):
+        static_manifest.load()
+    with startup.phase("engine"):
+        engine = get_engine()
+    if settings.OPENAPI_CACHE_PATH:
+        with startup.phase("openapi cache"):
+            openapi_cache.load(app, settings.OPENAPI_CACHE_PATH)
+    events.start_listener(engine)
+    reclaim.start_worker()
+    # Requests are served while warm-up runs; /health/ready waits for it
+    startup.start_warm_up()
+    yield
+    # Close pooled connections once in-flight requests have drained
+    startup.stop_warm_up()
+    events.stop_listener()
+    reclaim.stop_worker()
+    images.shutdown()
+    engine.dispose()
+    shards.dispose_engines()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
-# Set up CORS
+app.add_middleware(SlowQueryRouteMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Overloaded classes are shed before any other work
+app.add_middleware(AdmissionMiddleware)
+# Set up CORS outermost, so browsers can read the 503s admission sends
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for testing
@@ -24,31 +66,31 @@ app.add_middleware(
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 STATIC_DIR = os.path.join(BASE_DIR, "app", "static")
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# Mount static files, served from an in-memory manifest built at startup
+static_manifest = StaticManifest(STATIC_DIR)
+static_assets = StaticAssets(static_manifest)
+app.mount("/static", static_assets, name="static")
 
 # Import and include routers
 from app.api.v1.api import api_router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
-@app.get("/")
-async def root():
-    try:
-        index_path = os.path.join(STATIC_DIR, "index.html")
-        if not os.path.exists(index_path):
-            raise HTTPException(status_code=404, detail="index.html not found")
-        return FileResponse(index_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/{path:path}")
-async def serve_static(path: str):
-    try:
-        if path.endswith(".html"):
-            file_path = os.path.join(STATIC_DIR, path)
-            if not os.path.exists(file_path):
-                raise HTTPException(status_code=404, detail=f"File {path} not found")
-            return FileResponse(file_path)
-        return {"message": "Not Found"}, 404
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+@app.get("/", include_in_schema=False)
+def root(request: Request):
+    return static_assets.response("index.html", request.headers, request.method)
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    if not startup.ready.is_set():
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return {"status": "ready"}
+
+@app.get("/{page}.html", include_in_schema=False)
+def serve_page(page: str, request: Request):
+    return static_assets.response(f"{page}.html", request.headers, request.method)
+
+_import_seconds = time.perf_counter() - _import_started
@@ -0,0 +1,44 @@
+"""Bring item tables up to the schema declared in app/core/item_tables.py.
+
+    python -m app.maintenance [--workers N] [--product-id ID ...] [--dry-run]
+
+Adds missing columns and indexes to every items_{product_id} table, several
+tables at a time.  Safe to run while the API is serving, and to run again:
+tables already up to date are skipped and failed ones are retried.  The same
+step runs after migrations with `alembic -x item_tables=true upgrade head`.
+"""
+import argparse
+import sys
+
+from app.core import item_maintenance, item_tables
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply schema changes to every item table.")
+    parser.add_argument("--workers", type=int, default=None, help="tables altered in parallel")
+    parser.add_argument("--product-id", type=int, action="append", dest="product_ids")
+    parser.add_argument("--dry-run", action="store_true", help="print the DDL without running it")
+    options = parser.parse_args()
+
+    def report(shard, product_id, status, statements):
+        if status == "failed":
+            print(f"{shard}/items_{product_id}: failed", file=sys.stderr)
+        for statement in statements:
+            print(f"{shard}/items_{product_id}: {statement}")
+
+    counts = item_maintenance.run(
+        workers=options.workers,
+        product_ids=options.product_ids,
+        dry_run=options.dry_run,
+        on_table=report,
+    )
+    print(
+        f"Item schema version {item_tables.SCHEMA_VERSION}: {counts['done']} tables checked, "
+        f"{counts['skipped']} already up to date, {counts['failed']} failed"
+    )
+    if counts["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
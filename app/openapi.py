@@ -0,0 +1,26 @@
+"""Generate the OpenAPI document at build time.
+
+    python -m app.openapi [--output PATH]
+
+Writes the schema FastAPI would otherwise build on the first /docs or
+openapi.json request.  Point OPENAPI_CACHE_PATH at the file to have workers
+load it at startup.
+"""
+import argparse
+
+from app.core import openapi_cache
+from app.core.config import settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write the OpenAPI document to a file.")
+    parser.add_argument("--output", default=settings.OPENAPI_CACHE_PATH or "openapi.json")
+    options = parser.parse_args()
+
+    from app.main import app
+    openapi_cache.write(app, options.output)
+    print(f"Wrote {options.output}")
+
+
+if __name__ == "__main__":
+    main()
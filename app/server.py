@@ -0,0 +1,119 @@
+"""Production server entrypoint.
+
+    python -m app.server [--workers N] [--host HOST] [--port PORT]
+
+Runs several worker processes without the reloader.  When gunicorn is
+installed the app is imported once in the master and forked into
+UvicornWorkers (preload); otherwise uvicorn's own process manager is used and
+each worker imports the app itself.  `python main.py` stays the dev server.
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import sys
+
+from app.core.config import settings
+
+APP_PATH = "app.main:app"
+
+try:
+    from uvicorn.workers import UvicornWorker
+except ImportError:  # gunicorn is not installed
+    UvicornWorker = None
+
+
+def default_workers() -> int:
+    """One worker per CPU unless WEB_CONCURRENCY says otherwise."""
+    if settings.WEB_CONCURRENCY:
+        return settings.WEB_CONCURRENCY
+    return max(1, multiprocessing.cpu_count())
+
+
+def loop_implementation() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_implementation() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+if UvicornWorker is not None:
+    class Worker(UvicornWorker):
+        CONFIG_KWARGS = {
+            "loop": loop_implementation(),
+            "http": http_implementation(),
+            "timeout_graceful_shutdown": settings.SERVER_GRACEFUL_TIMEOUT,
+        }
+
+
+def run_gunicorn(options: dict) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        # Connections opened while preloading belong to the master; each
+        # worker must build its own pool instead of sharing those sockets.
+        from app.core.database import get_engine
+        get_engine().dispose(close=False)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{options['host']}:{options['port']}")
+            self.cfg.set("workers", options["workers"])
+            self.cfg.set("worker_class", "app.server.Worker")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("keepalive", options["keep_alive"])
+            self.cfg.set("backlog", options["backlog"])
+            self.cfg.set("graceful_timeout", options["graceful_timeout"])
+            self.cfg.set("post_fork", post_fork)
+
+        def load(self):
+            from app.main import app
+            return app
+
+    Application().run()
+
+
+def run_uvicorn(options: dict) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        APP_PATH,
+        host=options["host"],
+        port=options["port"],
+        workers=options["workers"],
+        loop=loop_implementation(),
+        http=http_implementation(),
+        timeout_keep_alive=options["keep_alive"],
+        backlog=options["backlog"],
+        timeout_graceful_shutdown=options["graceful_timeout"],
+        proxy_headers=True,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the API with production settings.")
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--keep-alive", type=int, default=settings.SERVER_KEEP_ALIVE)
+    parser.add_argument("--backlog", type=int, default=settings.SERVER_BACKLOG)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVER_GRACEFUL_TIMEOUT)
+    parser.add_argument("--no-gunicorn", action="store_true",
+                        help="use uvicorn's process manager even if gunicorn is installed")
+    options = vars(parser.parse_args())
+
+    if not options.pop("no_gunicorn") and UvicornWorker is not None:
+        run_gunicorn(options)
+    else:
+        if options["workers"] > 1:
+            reason = "--no-gunicorn was given" if UvicornWorker is not None else "gunicorn is not installed"
+            print(
+                f"Using uvicorn's process manager because {reason}: the app is not preloaded, "
+                "so each worker imports it and starts cold.",
+                file=sys.stderr,
+            )
+        run_uvicorn(options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Inspect item shards and move products between them.
+
+    python -m app.shards status
+    python -m app.shards move PRODUCT_ID SHARD [--settle-seconds N]
+
+Shards are configured with ITEM_SHARD_URLS; the main database is "default".
+A move blocks item writes of that product (503) until it finishes, keeps
+reads working throughout, and can be rerun to resume an interrupted move.
+"""
+import argparse
+
+from app.core import rebalance, shards
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.models import ItemShard
+
+
+def status() -> None:
+    db = SessionLocal()
+    try:
+        counts = shards.shard_counts(db)
+        moving = db.query(ItemShard).filter(ItemShard.status == "moving").all()
+    finally:
+        db.close()
+    for name, count in counts.items():
+        print(f"{name}: {count} products")
+    for placement in moving:
+        print(f"product {placement.product_id}: moving from {placement.shard} to {placement.moving_to}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect item shards and move products between them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="products per shard and moves in progress")
+    move = commands.add_parser("move", help="move a product's items to another shard")
+    move.add_argument("product_id", type=int)
+    move.add_argument("shard", choices=shards.shard_names())
+    move.add_argument(
+        "--settle-seconds", type=float, default=None,
+        help="wait after each step (default ITEM_SHARD_SETTLE_SECONDS); must exceed PRODUCT_CACHE_TTL_SECONDS",
+    )
+    options = parser.parse_args()
+    if (
+        options.command == "move"
+        and options.settle_seconds is not None
+        and options.settle_seconds <= settings.PRODUCT_CACHE_TTL_SECONDS
+    ):
+        parser.error(
+            f"--settle-seconds must exceed PRODUCT_CACHE_TTL_SECONDS ({settings.PRODUCT_CACHE_TTL_SECONDS})"
+        )
+
+    if options.command == "status":
+        status()
+        return
+    copied = rebalance.move_product(
+        options.product_id,
+        options.shard,
+        settle_seconds=options.settle_seconds,
+        on_batch=lambda copied: print(f"copied {copied} items"),
+    )
+    print(f"Product {options.product_id} is on shard {options.shard}; moved {copied} items")
+
+
+if __name__ == "__main__":
+    main()
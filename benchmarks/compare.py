@@ -0,0 +1,48 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as fh:
+        report = json.load(fh)
+    return {result["scenario"]: result for result in report["results"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    baseline = load(args.baseline)
+    candidate = load(args.candidate)
+    regressions = 0
+    print(f"{'scenario':20s} {'rps':>18s} {'p50 ms':>20s} {'p99 ms':>20s}")
+    for name, new in candidate.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        columns = []
+        for label, before, after, higher_is_better in (
+            ("rps", old["throughput_rps"], new["throughput_rps"], True),
+            ("p50", old["latency_ms"]["p50"], new["latency_ms"]["p50"], False),
+            ("p99", old["latency_ms"]["p99"], new["latency_ms"]["p99"], False),
+        ):
+            change = (after - before) / before * 100 if before else 0.0
+            worse = change < -args.threshold if higher_is_better else change > args.threshold
+            regressions += worse
+            columns.append(f"{after:>10} ({change:+6.1f}%){'!' if worse else ' '}")
+        print(f"{name:20s} " + " ".join(columns))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Run the API benchmark suite and write machine-readable results.
+
+The database given by --database-url is created and seeded from scratch, then
+each scenario is driven either in-process through the ASGI app or over HTTP
+against a local uvicorn.  Results are written as JSON so runs from different
+commits can be compared.
+
+Usage:
+    python -m benchmarks.run --database-url sqlite:///./bench.db --mode asgi
+    python -m benchmarks.run --database-url postgresql://u:p@localhost/bench --mode uvicorn
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+API = "/api/v1"
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def login(client, ctx, rng):
+    return await client.post(
+        f"{API}/auth/login",
+        data={"username": ctx["username"], "password": ctx["password"]},
+    )
+
+
+async def list_companies(client, ctx, rng):
+    return await client.get(f"{API}/companies/", headers=ctx["headers"])
+
+
+async def list_products(client, ctx, rng):
+    return await client.get(f"{API}/products/", headers=ctx["headers"])
+
+
+async def list_items(client, ctx, rng):
+    product_id = rng.choice(ctx["product_ids"])
+    return await client.get(f"{API}/items/{product_id}", headers=ctx["headers"])
+
+
+async def lookup_item(client, ctx, rng):
+    # Single-row reads at a random depth, the way scanners page to an item
+    product_id = rng.choice(ctx["product_ids"])
+    skip = rng.randrange(max(1, ctx["items_per_product"]))
+    return await client.get(
+        f"{API}/items/{product_id}",
+        params={"skip": skip, "limit": 1},
+        headers=ctx["headers"],
+    )
+
+
+async def create_item(client, ctx, rng):
+    product_id = rng.choice(ctx["product_ids"])
+    return await client.post(
+        f"{API}/items/{product_id}",
+        json={"key": f"bench-{rng.getrandbits(64):x}", "box_key": "BENCHBOX"},
+        headers=ctx["headers"],
+    )
+
+
+async def create_batch_items(client, ctx, rng):
+    product_id = rng.choice(ctx["product_ids"])
+    return await client.post(
+        f"{API}/items/{product_id}/batch",
+        json={"quantity": ctx["batch_size"], "box_key": "BENCHBOX"},
+        headers=ctx["headers"],
+    )
+
+
+SCENARIOS = {
+    "login": login,
+    "list_companies": list_companies,
+    "list_products": list_products,
+    "list_items": list_items,
+    "lookup_item": lookup_item,
+    "create_item": create_item,
+    "create_batch_items": create_batch_items,
+}
+
+
+async def run_scenario(client, name: str, ctx: dict, requests: int, concurrency: int, seed: int) -> dict:
+    scenario = SCENARIOS[name]
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            started = time.perf_counter()
+            response = await scenario(client, ctx, rng)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_started
+    latencies.sort()
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        },
+    }
+
+
+async def run_all(client, ctx: dict, args) -> list:
+    response = await login(client, ctx, None)
+    response.raise_for_status()
+    ctx["headers"] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    results = []
+    for name in args.scenarios:
+        # Login is bcrypt-bound, so it gets a smaller share of requests
+        requests = max(1, args.requests // 10) if name == "login" else args.requests
+        if args.warmup:
+            await run_scenario(client, name, ctx, args.warmup, args.concurrency, args.seed + 1)
+        result = await run_scenario(client, name, ctx, requests, args.concurrency, args.seed)
+        print(
+            f"{name:20s} {result['throughput_rps']:>9} rps  "
+            f"p50 {result['latency_ms']['p50']:>8} ms  p99 {result['latency_ms']['p99']:>8} ms  "
+            f"errors {result['errors']}",
+            file=sys.stderr,
+        )
+        results.append(result)
+    return results
+
+
+async def run_asgi(ctx: dict, args) -> list:
+    import httpx
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_all(client, ctx, args)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(ctx: dict, args) -> list:
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    await client.get(f"{API}/openapi.json")
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("uvicorn did not start")
+                    await asyncio.sleep(0.2)
+            return await run_all(client, ctx, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--mode", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--items", type=int, default=10000, help="items per product")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+
+    # Settings are read at import time, so the URL must be in place first
+    os.environ["DATABASE_URL"] = args.database_url
+    from app.core.database import Base, get_engine
+    from benchmarks import seed
+
+    engine = get_engine()
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as connection:
+        for table_name in engine.dialect.get_table_names(connection):
+            if table_name.startswith("items_"):
+                connection.exec_driver_sql(f'DROP TABLE "{table_name}"')
+    seeded_at = time.perf_counter()
+    ctx = seed.seed(args.users, args.companies, args.products, args.items, args.seed)
+    seed_seconds = time.perf_counter() - seeded_at
+    ctx["batch_size"] = args.batch_size
+    engine.dispose()
+
+    runner = run_asgi if args.mode == "asgi" else run_uvicorn
+    results = asyncio.run(runner(ctx, args))
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_revision": git_revision(),
+        "mode": args.mode,
+        "database": engine.dialect.name,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": {
+            "users": args.users,
+            "companies": args.companies,
+            "products": args.products,
+            "items_per_product": args.items,
+            "seed_seconds": round(seed_seconds, 3),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Seed a database with synthetic users, companies, products and items.
+
+Usage:
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --products 20 --items 50000
+"""
+import argparse
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from app.core import security
+from app.core.database import Base, SessionLocal, get_engine
+from app.core.models import Company, Product, User, UserCompany
+from app.core.item_tables import get_items_table
+
+BENCH_PASSWORD = "bench-password"
+ITEM_CHUNK_SIZE = 5000
+
+
+def seed(users: int, companies: int, products: int, items: int, seed: int = 42) -> dict:
+    """Create the synthetic dataset and return the ids the benchmarks need."""
+    rng = random.Random(seed)
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        # One hash for everyone: seeding should not be dominated by bcrypt
+        hashed_password = security.get_password_hash(BENCH_PASSWORD)
+        user_rows = [
+            User(
+                username=f"bench_user_{i}",
+                email=f"bench_user_{i}@example.com",
+                hashed_password=hashed_password,
+                role="admin" if i == 0 else "staff",
+                permission="all",
+            )
+            for i in range(users)
+        ]
+        db.add_all(user_rows)
+
+        company_rows = [
+            Company(
+                id=f"BENCH{i:06d}",
+                code=f"BC{i:06d}",
+                name=f"Bench Company {i}",
+                address=f"{i} Benchmark Street",
+            )
+            for i in range(companies)
+        ]
+        db.add_all(company_rows)
+        db.flush()
+
+        for i, user in enumerate(user_rows):
+            db.add(UserCompany(user_id=user.id, company_id=company_rows[i % companies].id))
+
+        product_rows = [
+            Product(
+                code=f"BP{i:06d}",
+                name=f"Bench Product {i}",
+                description=f"Synthetic product number {i} for load testing",
+                company_id=company_rows[i % companies].id,
+            )
+            for i in range(products)
+        ]
+        db.add_all(product_rows)
+        db.commit()
+        product_ids = [product.id for product in product_rows]
+    finally:
+        db.close()
+
+    started = datetime.utcnow() - timedelta(days=365)
+    items_tables = [get_items_table(product_id) for product_id in product_ids]
+    with engine.begin() as connection:
+        for items_table in items_tables:
+            for offset in range(0, items, ITEM_CHUNK_SIZE):
+                rows = [
+                    {
+                        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                        "key": str(uuid.UUID(int=rng.getrandbits(128))),
+                        "box_key": f"BOX{(offset + n) // 100:08d}",
+                        "created_at": started + timedelta(seconds=offset + n),
+                    }
+                    for n in range(min(ITEM_CHUNK_SIZE, items - offset))
+                ]
+                connection.execute(items_table.insert(), rows)
+
+    return {
+        "username": "bench_user_0",
+        "password": BENCH_PASSWORD,
+        "product_ids": product_ids,
+        "items_per_product": items,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--companies", type=int, default=10)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--items", type=int, default=10000, help="items per product")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    result = seed(args.users, args.companies, args.products, args.items, args.seed)
+    print(f"seeded {len(result['product_ids'])} products x {args.items} items")
+
+
+if __name__ == "__main__":
+    main()
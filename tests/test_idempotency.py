@@ -0,0 +1,93 @@
+import asyncio
+from datetime import timedelta
+
+from app.core import security
+from app.core.config import settings
+from app.core.idempotency import IdempotencyMiddleware
+
+PATH = f"{settings.API_V1_STR}/items"
+
+
+class FlakyApp:
+    """Fails its first call with a 500, then creates."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        call = self.calls
+        await receive()
+        await asyncio.sleep(0.05)
+        status = 500 if call == 1 else 201
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"call": %d}' % call})
+
+
+async def post(app, key, authorization="", body=b"{}"):
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": PATH,
+        "query_string": b"",
+        "headers": [(b"idempotency-key", key.encode()), (b"authorization", authorization.encode())],
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], dict(start["headers"]), body
+
+
+def test_waiters_retry_once_after_failed_attempt():
+    inner = FlakyApp()
+    app = IdempotencyMiddleware(inner)
+
+    async def run():
+        return await asyncio.gather(*(post(app, "k1") for _ in range(4)))
+
+    results = asyncio.run(run())
+
+    assert inner.calls == 2
+    statuses = sorted(status for status, _, _ in results)
+    assert statuses == [201, 201, 201, 500]
+    created = [(headers, body) for status, headers, body in results if status == 201]
+    assert all(body == b'{"call": 2}' for _, body in created)
+    assert sum(headers.get(b"idempotent-replayed") == b"true" for headers, _ in created) == 2
+
+
+def test_key_is_scoped_to_token_subject():
+    inner = FlakyApp()
+    inner.calls = 1
+    app = IdempotencyMiddleware(inner)
+    first = "Bearer " + security.create_access_token(7)
+    refreshed = "Bearer " + security.create_access_token(7, timedelta(minutes=5))
+    assert refreshed != first
+    other = "Bearer " + security.create_access_token(8)
+
+    async def run():
+        return [
+            await post(app, "k2", first),
+            await post(app, "k2", refreshed),
+            await post(app, "k2", other),
+        ]
+
+    (_, _, body1), (_, headers2, body2), (_, headers3, _) = asyncio.run(run())
+
+    assert body2 == body1
+    assert headers2.get(b"idempotent-replayed") == b"true"
+    assert b"idempotent-replayed" not in headers3
+    assert inner.calls == 3